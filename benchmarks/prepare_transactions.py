@@ -0,0 +1,80 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+# Measures the rows per second of the transactions normalizer over synthetic
+# transactions shaped like the Gocardless api ones.
+#
+# Usage, from the bench environment:
+#   python benchmarks/prepare_transactions.py [rows] [repeat]
+
+
+import copy
+import random
+import sys
+import time
+
+from erpnext_gocardless_bank.libs.gocardless_api import GocardlessApi
+from erpnext_gocardless_bank.libs.gocardless_common import get_json_backend
+
+
+def make_transaction(i):
+    entry = {
+        "transactionId": f"TX{i:010d}",
+        "bookingDate": "2023-06-01",
+        "valueDate": "2023-06-02",
+        "bookingDateTime": "2023-06-01T10:00:00Z",
+        "transactionAmount": {
+            "amount": "{0:.2f}".format(random.uniform(-5000, 5000)),
+            "currency": "EUR"
+        },
+        "bankTransactionCode": "PMNT",
+        "remittanceInformationUnstructured": f"Invoice {i}",
+        "remittanceInformationUnstructuredArray": [f"Invoice {i}", "Ref"],
+        "endToEndId": f"E2E{i}",
+        "internalTransactionId": f"INT{i}",
+        "proprietaryBankTransactionCode": "TRANSFER",
+    }
+    if i % 2:
+        entry.update({
+            "creditorName": f"Supplier {i % 500}",
+            "creditorAccount": {"iban": f"DE{i:020d}"},
+        })
+    else:
+        entry.update({
+            "debtorName": f"Customer {i % 500}",
+            "debtorAccount": {"iban": f"GB{i:020d}"},
+        })
+    if i % 10 == 0:
+        entry["currencyExchange"] = {
+            "sourceCurrency": "USD",
+            "exchangeRate": "1.08",
+            "targetCurrency": "EUR",
+            "quotationDate": "2023-06-01",
+        }
+    
+    return entry
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    random.seed(0)
+    data = [make_transaction(i) for i in range(rows)]
+    best = None
+    for _ in range(repeat):
+        batch = copy.deepcopy(data)
+        start = time.perf_counter()
+        GocardlessApi.prepare_transactions(batch)
+        took = time.perf_counter() - start
+        best = took if best is None else min(best, took)
+    
+    print("{0} rows in {1:.3f}s, {2:,.0f} rows/sec, {3} backend".format(
+        rows, best, rows / best, get_json_backend()
+    ))
+
+
+if __name__ == "__main__":
+    main()
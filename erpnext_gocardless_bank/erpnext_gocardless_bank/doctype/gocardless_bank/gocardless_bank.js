@@ -35,6 +35,82 @@ frappe.gocardless.events = {
 };
 
 
+// The banks are searched on the server as the bank name is typed, a page at
+// a time, and the next page is loaded when the list is scrolled to its end.
+frappe.gocardless.banks = {
+    limit: 50,
+    bind: function(frm) {
+        let field = frm.get_field('bank');
+        if (frm._banks.bound || !field || !field.$input) return;
+        frm._banks.bound = true;
+        var me = this;
+        field.$input.on('input', function() {
+            let query = cstr(field.$input.val()).trim();
+            if (frm._banks.timer) window.clearTimeout(frm._banks.timer);
+            frm._banks.timer = window.setTimeout(function() {
+                frm._banks.timer = null;
+                if (query !== frm._banks.query) me.search(frm, query, 0);
+            }, 300);
+        });
+        if (!field.awesomplete) return;
+        // The banks received already match the query, by name, id or bic.
+        field.awesomplete.filter = function() { return true; };
+        field.awesomplete.maxItems = Infinity;
+        $(field.awesomplete.ul).on('scroll', function() {
+            if (this.scrollTop + this.clientHeight < this.scrollHeight - 20) return;
+            let banks = frm._banks;
+            if (banks.loading || banks.offset >= banks.total) return;
+            me.search(frm, banks.query, banks.offset);
+        });
+    },
+    search: function(frm, query, offset) {
+        let banks = frm._banks,
+        req = ++banks.req,
+        args = {query: query, limit: this.limit, offset: offset};
+        if (banks.key !== 'all') args.country = banks.key;
+        banks.loading = true;
+        frappe.gocardless().request(
+            'search_banks',
+            args,
+            function(ret) {
+                if (req !== banks.req) return;
+                banks.loading = false;
+                if (!ret || !$.isPlainObject(ret) || !Array.isArray(ret.data)) {
+                    this._error('Invalid banks list.', ret);
+                    this.error('The banks list received is invalid.');
+                    return;
+                }
+                
+                let list = ret.data.slice();
+                if (!offset) {
+                    banks.data = [];
+                    // @todo: For debug, remove in production
+                    if (!query.length) list.unshift({
+                        id: 'SANDBOXFINANCE_SFIN0000',
+                        name: 'Sandbox Finance (Testing)',
+                    });
+                }
+                for (let i = 0, l = list.length, v; i < l; i++) {
+                    v = list[i];
+                    banks.cache[v.name] = Object.assign({}, v);
+                    banks.data.push({label: __(v.name), value: v.name});
+                }
+                banks.query = query;
+                banks.offset = offset + ret.data.length;
+                banks.total = cint(ret.total);
+                frm.get_field('bank').set_data(banks.data);
+                this._log('setting banks');
+            },
+            function() {
+                if (req !== banks.req) return;
+                banks.loading = false;
+                this.error('Unable to load the list of banks.');
+            }
+        );
+    },
+};
+
+
 frappe.ui.form.on('Gocardless Bank', {
     setup: function(frm) {
         frappe.gocardless();
@@ -43,7 +119,10 @@ frappe.ui.form.on('Gocardless Bank', {
         frm._gocardless_setup = false;
         frm._gocardless_disabled = false;
         frm._company_country = null;
-        frm._banks = {key: '', list: {}, cache: {}};
+        frm._banks = {
+            key: '', query: '', offset: 0, total: 0, req: 0,
+            timer: null, bound: false, data: [], cache: {}
+        };
         frm._bank_accounts_loading_key = 'gocardless_loading_accounts_ts';
         frm._bank_accounts_loading_timeout = 5;
         frm._linked_bank_accounts = null;
@@ -92,19 +171,13 @@ frappe.ui.form.on('Gocardless Bank', {
             return;
         }
         if (frm._form_disabled) return;
-        let cache = frm._banks.cache[frm._banks.key],
-        found = false,
-        i = 0,
-        l = cache.length;
-        for (; i < l; i++) {
-            if (cache[i].name === val) {
-                frm.set_value('bank_id', cache[i].id);
-                frm.set_value('transaction_days', cint(cache[i].transaction_total_days || 90));
-                found = true;
-                break;
-            }
+        let bank = frm._banks.cache[val];
+        if (!bank) {
+            frappe.gocardless().error('Please select a valid bank.');
+            return;
         }
-        if (!found) frappe.gocardless().error('Please select a valid bank.');
+        frm.set_value('bank_id', bank.id);
+        frm.set_value('transaction_days', cint(bank.transaction_total_days || 90));
     },
     validate: function(frm) {
         if (!cstr(frm.doc.company).length)
@@ -268,49 +341,14 @@ frappe.ui.form.on('Gocardless Bank', {
     },
     load_banks: function(frm) {
         if (frm._form_disabled) return;
+        frappe.gocardless.banks.bind(frm);
         let country = cstr(frm.doc.country);
         var key = country.length ? country : 'all';
         if (frm._banks.key === key) return;
-        if (frm._banks.list[key]) {
-            frm._banks.key = key;
-            frm.get_field('bank').set_data(frm._banks.list[key]);
-            frappe.gocardless()._log('setting banks');
-            return;
-        }
+        frm._banks.key = key;
+        frm._banks.cache = {};
         frappe.gocardless()._log('loading banks');
-        frappe.gocardless().request(
-            'get_banks',
-            country.length ? {country: country} : null,
-            function(ret) {
-                if (!Array.isArray(ret)) {
-                    this._error('Invalid banks list.', ret);
-                    this.error('The banks list received is invalid.');
-                    return;
-                }
-                
-                // @todo: For debug, remove in production
-                ret.unshift({
-                    id: 'SANDBOXFINANCE_SFIN0000',
-                    name: 'Sandbox Finance (Testing)',
-                });
-                
-                let data = [],
-                cache = [];
-                for (let i = 0, l = ret.length, v; i < l; i++) {
-                    v = ret[i];
-                    cache.push(Object.assign({}, v));
-                    data.push({label: __(v.name), value: v.name});
-                }
-                frm._banks.key = key;
-                frm._banks.list[key] = data;
-                frm._banks.cache[key] = cache;
-                frm.get_field('bank').set_data(data);
-                frappe.gocardless()._log('setting banks');
-            },
-            function() {
-                this.error('Unable to load the list of banks.');
-            }
-        );
+        frappe.gocardless.banks.search(frm, '', 0);
     },
     load_toolbar: function(frm) {
         if (
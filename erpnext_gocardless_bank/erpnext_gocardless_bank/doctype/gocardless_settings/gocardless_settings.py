@@ -10,7 +10,11 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 
-from erpnext_gocardless_bank.libs.gocardless import error, clear_doc_cache
+from erpnext_gocardless_bank.libs.gocardless import (
+    error,
+    clear_doc_cache,
+    clear_token_cache
+)
 
 
 class GocardlessSettings(Document):
@@ -32,4 +36,9 @@ class GocardlessSettings(Document):
             error(_("Please provide a valid secret key."), False, "KrgqU2TDwE")
     
     def before_save(self):
-        clear_doc_cache()
\ No newline at end of file
+        clear_doc_cache()
+        if (
+            self.has_value_changed("secret_id") or
+            self.has_value_changed("secret_key")
+        ):
+            clear_token_cache()
\ No newline at end of file
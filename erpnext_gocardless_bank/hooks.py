@@ -36,9 +36,37 @@ after_install = "erpnext_gocardless_bank.setup.install.after_install"
 before_uninstall = "erpnext_gocardless_bank.setup.uninstall.before_uninstall"
 
 
+doc_events = {
+    "Currency": {
+        "on_update": "erpnext_gocardless_bank.libs.gocardless_currencies.clear_currencies_cache",
+        "after_rename": "erpnext_gocardless_bank.libs.gocardless_currencies.clear_currencies_cache",
+        "on_trash": "erpnext_gocardless_bank.libs.gocardless_currencies.clear_currencies_cache"
+    },
+    "Supplier": {
+        "on_update": "erpnext_gocardless_bank.libs.gocardless_parties.clear_party_index",
+        "after_rename": "erpnext_gocardless_bank.libs.gocardless_parties.clear_party_index",
+        "on_trash": "erpnext_gocardless_bank.libs.gocardless_parties.clear_party_index"
+    },
+    "Customer": {
+        "on_update": "erpnext_gocardless_bank.libs.gocardless_parties.clear_party_index",
+        "after_rename": "erpnext_gocardless_bank.libs.gocardless_parties.clear_party_index",
+        "on_trash": "erpnext_gocardless_bank.libs.gocardless_parties.clear_party_index"
+    },
+    "Bank Account": {
+        "on_update": "erpnext_gocardless_bank.libs.gocardless_parties.clear_party_index",
+        "after_rename": "erpnext_gocardless_bank.libs.gocardless_parties.clear_party_index",
+        "on_trash": "erpnext_gocardless_bank.libs.gocardless_parties.clear_party_index"
+    }
+}
+
+
 scheduler_events = {
+    "hourly": [
+        "erpnext_gocardless_bank.libs.gocardless.refresh_token"
+    ],
     "daily": [
-        "erpnext_gocardless_bank.libs.gocardless.update_banks_status"
+        "erpnext_gocardless_bank.libs.gocardless.update_banks_status",
+        "erpnext_gocardless_bank.libs.gocardless.expire_pending_transactions"
     ],
     "cron": {
         "0 */6 * * *": [
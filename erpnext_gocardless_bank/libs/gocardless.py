@@ -4,12 +4,13 @@
 # Licence: Please refer to LICENSE file
 
 
-from datetime import datetime
-import hashlib
+from datetime import datetime, timezone
+import time
 import uuid
 
 import frappe
 from frappe import _, _dict
+from frappe.model.naming import set_new_name
 from frappe.utils import (
     cint,
     flt,
@@ -17,6 +18,7 @@ from frappe.utils import (
     add_to_date,
     formatdate,
     getdate,
+    now_datetime,
     DATE_FORMAT,
     DATETIME_FORMAT
 )
@@ -26,17 +28,71 @@ from .gocardless_common import (
     error,
     log_error,
     log_info,
+    parse_json,
     to_json
 )
+from .gocardless_breaker import is_open as is_circuit_open
+from .gocardless_banks import (
+    cache_banks,
+    get_banks_index,
+    is_banks_index_stale,
+    search_banks_index
+)
 from .gocardless_connector import GocardlessConnector
+from .gocardless_currencies import get_currencies
+from .gocardless_limiter import remaining as get_remaining_quota
+from .gocardless_parties import (
+    add_party,
+    clear_party_index,
+    get_party_index,
+    resolve_party
+)
+from .gocardless_pipeline import (
+    dedupe,
+    normalize,
+    number,
+    persist,
+    reconcile,
+    track,
+    validate,
+    watch
+)
+from .gocardless_pending import (
+    dump_key,
+    load_key,
+    make_pending_index,
+    match_pending
+)
+from .gocardless_planner import plan_sync_windows
+from .gocardless_spool import has_spool, read_spool, remove_spool, write_spool
+from .gocardless_thread_connector import ThreadGocardlessConnector
+from .gocardless_transaction import make_transaction_id
+from .gocardless_watermark import (
+    get_pending_watermark,
+    is_seen,
+    make_watermark,
+    observe
+)
 
 
 _SETTINGS_ = "Gocardless Settings"
 _BANK_ = "Gocardless Bank"
 _BANK_ACCOUNT_ = "Gocardless Bank Account"
 _SYNC_LOG_ = "Gocardless Sync Log"
+_BANKS_REFRESH_EXPIRY = 10 * 60
 _SYNC_LIMIT = 4
 _SYNC_CACHE_KEY = "gocardless_auto_sync"
+_SYNC_LOCK_EXPIRY = 30 * 60
+_SYNC_STATE_EXPIRY = 3 * 24 * 3600
+_SYNC_BATCH_SIZE = 200
+_SYNC_PRELOAD_MARGIN = 7
+_SYNC_OVERLAP_DAYS = 2
+_SYNC_PRELOAD_LIMIT = 200000
+_TOKEN_CACHE_KEY = "gocardless_access_token"
+_TOKEN_LOCK_KEY = "gocardless_access_token_lock"
+_TOKEN_LOCK_TIMEOUT = 30
+_TOKEN_MIN_TTL = 300
+_TOKEN_REFRESH_MARGIN = 3 * 3600
 
 
 def clear_sync_cache():
@@ -101,38 +157,161 @@ def is_enabled():
 
 
 def get_client():
+    client = make_client()
+    client.set_access(get_token(client)["access"])
+    return client
+
+
+def make_client():
     doc = get_doc()
-    now_dt = datetime.utcnow()
     client = GocardlessConnector()
-    if doc.access_token and get_datetime(doc.access_expiry) > now_dt:
-        client.set_access(doc.access_token)
-        return client
+    client.configure(
+        doc.get("request_connect_timeout"),
+        doc.get("request_read_timeout"),
+        doc.get("request_max_retries")
+    )
+    return client
+
+
+def clear_token_cache():
+    frappe.cache().delete_value(_TOKEN_CACHE_KEY)
+
+
+# The token is shared by all the workers through redis and only one of them,
+# the one holding the lock, renews it while the others wait for the result.
+def get_token(client=None, min_ttl=_TOKEN_MIN_TTL):
+    if is_valid_token(token := get_cached_token(), min_ttl):
+        return token
+    
+    lock = frappe.cache().lock(
+        frappe.cache().make_key(_TOKEN_LOCK_KEY),
+        timeout=_TOKEN_LOCK_TIMEOUT,
+        blocking_timeout=_TOKEN_LOCK_TIMEOUT
+    )
+    # The error is only logged once in a while, so the timeout is always
+    # thrown here, to never renew the token without holding the lock.
+    if not lock.acquire():
+        msg = _("Timed out while waiting for the Gocardless access token.")
+        error(msg, False, "tKw3ZQeB6u")
+        frappe.throw(msg, title=_("Gocardless"))
+    
+    try:
+        if is_valid_token(token := get_cached_token(True), min_ttl):
+            return token
+        
+        token = renew_token(client, token)
+        frappe.cache().set_value(
+            _TOKEN_CACHE_KEY, token,
+            expires_in_sec=max(cint(token["refresh_expiry"] - time.time()), _TOKEN_MIN_TTL)
+        )
+        enqueue_store_token()
+        return token
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            pass
+
+
+def get_cached_token(fresh=False):
+    if fresh and isinstance(getattr(frappe.local, "cache", None), dict):
+        frappe.local.cache.pop(frappe.cache().make_key(_TOKEN_CACHE_KEY), None)
+    
+    token = frappe.cache().get_value(_TOKEN_CACHE_KEY)
+    if token and isinstance(token, dict):
+        return token
     
-    if doc.refresh_token and get_datetime(doc.refresh_expiry) > now_dt:
-        client.refresh(doc.refresh_token)
+    doc = get_doc()
+    return {
+        "access": doc.access_token or "",
+        "access_expiry": get_token_expiry(doc.access_expiry),
+        "refresh": doc.refresh_token or "",
+        "refresh_expiry": get_token_expiry(doc.refresh_expiry),
+    }
+
+
+def get_token_expiry(value):
+    if not value:
+        return 0
+    return get_datetime(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+def is_valid_token(token, min_ttl=_TOKEN_MIN_TTL):
+    return bool(
+        token and token.get("access") and
+        token.get("access_expiry", 0) - time.time() > min_ttl
+    )
+
+
+def renew_token(client, token):
+    if client is None:
+        client = make_client()
+    
+    now = time.time()
+    if token.get("refresh") and token.get("refresh_expiry", 0) - now > _TOKEN_MIN_TTL:
+        client.refresh(token["refresh"])
     else:
+        doc = get_doc()
         client.connect(doc.secret_id, doc.secret_key)
     
-    doc = get_doc(True)
     access = client.get_access()
-    if "refresh" in access:
-        doc.refresh_token = access["refresh"]
-        doc.refresh_expiry = add_to_date(
-            now_dt,
-            seconds=cint(access["refresh_expires"]),
-            as_string=True,
-            as_datetime=True
+    token = dict(token)
+    if "refresh" in access and "refresh_expires" in access:
+        token["refresh"] = access["refresh"]
+        token["refresh_expiry"] = now + cint(access["refresh_expires"])
+    
+    token["access"] = access["access"]
+    token["access_expiry"] = now + cint(access["access_expires"])
+    return token
+
+
+# Internal
+def enqueue_store_token():
+    if __frappe_version_min_15__:
+        frappe.enqueue(
+            "erpnext_gocardless_bank.libs.gocardless.store_token",
+            job_id="gocardless-store-token",
+            deduplicate=True,
+            queue="short",
+            is_async=True
+        )
+    else:
+        frappe.enqueue(
+            "erpnext_gocardless_bank.libs.gocardless.store_token",
+            job_name="gocardless-store-token",
+            queue="short",
+            is_async=True
         )
+
+
+# Internal
+def store_token():
+    token = frappe.cache().get_value(_TOKEN_CACHE_KEY)
+    if not token or not isinstance(token, dict):
+        return 0
     
-    doc.access_token = access["access"]
-    doc.access_expiry = add_to_date(
-        now_dt,
-        seconds=cint(access["access_expires"]),
-        as_string=True,
-        as_datetime=True
-    )
-    doc.save(ignore_permissions=True)
-    return client
+    frappe.db.set_single_value(_SETTINGS_, {
+        "access_token": token["access"],
+        "access_expiry": datetime.utcfromtimestamp(token["access_expiry"]).strftime(DATETIME_FORMAT),
+        "refresh_token": token["refresh"],
+        "refresh_expiry": datetime.utcfromtimestamp(token["refresh_expiry"]).strftime(DATETIME_FORMAT),
+    })
+    clear_doc_cache()
+    return 1
+
+
+# Hourly Schedule
+def refresh_token():
+    if is_enabled():
+        get_token(min_ttl=_TOKEN_REFRESH_MARGIN)
+
+
+def get_batch_client(client=None):
+    doc = get_doc()
+    if client is None:
+        client = get_client()
+    
+    return ThreadGocardlessConnector(client, doc.get("accounts_fetch_workers"))
 
 
 # Gocardless Bank Form
@@ -141,12 +320,78 @@ def get_banks(country=None, pay_option=False):
     if not is_enabled():
         return []
     
+    index = get_banks_list(country, pay_option)
+    if index is None or "error" in index:
+        return index
+    
+    return index["banks"]
+
+
+# Gocardless Bank Form
+@frappe.whitelist()
+def search_banks(country=None, query=None, pay_option=False, limit=20, offset=0):
+    if not is_enabled():
+        return {"total": 0, "data": []}
+    
+    index = get_banks_list(country, pay_option)
+    if index is None or "error" in index:
+        return index
+    
+    return search_banks_index(index, query, limit, offset)
+
+
+# Internal
+def get_banks_list(country=None, pay_option=False):
     if not isinstance(country, str):
         country = None
     elif country:
         country = get_country_code(country) if len(country) > 2 else country.upper()
     
-    return get_client().get_banks(country, pay_option)
+    pay_option = pay_option in (True, 1, "1", "true")
+    
+    if (index := get_banks_index(country, pay_option)):
+        if is_banks_index_stale(index):
+            enqueue_refresh_banks(country, pay_option)
+        return index
+    
+    return refresh_banks(country, pay_option)
+
+
+# Internal
+def enqueue_refresh_banks(country, pay_option):
+    job = "gocardless-refresh-banks-{0}-{1}".format(country or "all", 1 if pay_option else 0)
+    if __frappe_version_min_15__:
+        frappe.enqueue(
+            "erpnext_gocardless_bank.libs.gocardless.refresh_banks",
+            job_id=job,
+            deduplicate=True,
+            is_async=True,
+            country=country,
+            pay_option=pay_option
+        )
+    else:
+        # The jobs are not deduplicated before v15, so a flag is kept while
+        # the refresh is queued.
+        if frappe.cache().get_value(job, expires=True):
+            return None
+        
+        frappe.cache().set_value(job, 1, expires_in_sec=_BANKS_REFRESH_EXPIRY)
+        frappe.enqueue(
+            "erpnext_gocardless_bank.libs.gocardless.refresh_banks",
+            job_name=job,
+            is_async=True,
+            country=country,
+            pay_option=pay_option
+        )
+
+
+# Internal
+def refresh_banks(country, pay_option):
+    banks = get_client().get_banks(country, pay_option)
+    if not isinstance(banks, list):
+        return banks
+    
+    return cache_banks(country, pay_option, banks)
 
 
 def get_country_code(country):
@@ -289,26 +534,23 @@ def get_client_bank_accounts(bank, auth_id, publish = True):
         return 0
     
     data = []
-    for v in accounts:
-        acc_data = client.get_account_data(v)
-        if "error" in acc_data:
-            report_error(acc_data, False)
+    for v in get_batch_client(client).get_accounts_info(accounts):
+        if "error" in v["data"]:
+            report_error(v["data"], False)
             continue
-            
-        acc_balances = client.get_account_balances(v)
-        if "error" in acc_balances:
-            report_error(acc_balances, False)
+        
+        if "error" in v["balances"]:
+            report_error(v["balances"], False)
             continue
         
-        acc_details = client.get_account_details(v)
-        if "error" in acc_details:
-            report_error(acc_details, False)
+        if "error" in v["details"]:
+            report_error(v["details"], False)
             continue
         
-        account = {"id": v}
-        account.update(acc_data)
-        account.update({"balances": to_json(acc_balances)})
-        account.update(acc_details)
+        account = {"id": v["id"]}
+        account.update(v["data"])
+        account.update({"balances": to_json(v["balances"])})
+        account.update(v["details"])
         data.append(account)
     
     return data
@@ -664,7 +906,7 @@ def enqueue_bank_account_sync(bank, account, from_date=None, to_date=None):
         ).format(account, bank), code="MgZDdh8xyM")
         return -3
     
-    if frappe.cache().hget(_SYNC_CACHE_KEY, account):
+    if is_syncing(account):
         return 1
     
     now = datetime.utcnow()
@@ -696,43 +938,39 @@ def enqueue_bank_account_sync(bank, account, from_date=None, to_date=None):
         if from_date == today:
             from_date = None
         else:
-            date_from_obj = datetime.strptime(from_date, DATE_FORMAT)
-            date_delta = datetime.strptime(to_date, DATE_FORMAT) - date_from_obj
-            date_diff = cint(date_delta.days)
-            last_date = date_from_obj
-            has_error = 0
-            total = 0
-            for i in range(0, date_diff, 2):
-                total += 1
-                if i > 0:
-                    last_date = add_to_date(last_date, days=1)
-                
-                date_from = last_date.strftime(DATE_FORMAT)
-                last_date = add_to_date(last_date, days=1)
-                date_to = last_date.strftime(DATE_FORMAT)
-                if not sync_bank_account(
-                    settings, client, bank, doc.bank, "Manual",
-                    data.name, data.account, data.account_id,
-                    data.bank_account, date_from, date_to
-                ):
-                    has_error += 1
+            windows, cut = plan_sync_windows(
+                from_date, to_date, doc.transaction_days,
+                get_sync_quota(bank, data.account, data.account_id), today
+            )
+            if not windows:
+                error(_(
+                    "Unable to sync Gocardless bank account \"{0}\" of {1} from {2} to {3}, " +
+                    "since the range is out of the bank history or the daily sync limit has been reached."
+                ).format(
+                    data.account, bank, from_date, to_date
+                ), False, "Qm7RkVh3Zs")
+                return 0
             
-            if has_error:
-                if has_error == total:
-                    error(_(
-                        "There was an error while syncing " +
-                        "Gocardless bank account \"{0}\" of {1} from {2} to {3}."
-                    ).format(
-                        data.account, bank, from_date, to_date
-                    ), False, "nMar7aW44f")
-                    return 0
-                else:
-                    error(_(
-                        "There was {0} errors while syncing " +
-                        "Gocardless bank account \"{1}\" of {2} from {3} to {4}."
-                    ).format(
-                        has_error, data.account, bank, from_date, to_date
-                    ), False, "tyHwW4S2tj")
+            if cut:
+                frappe.msgprint(_(
+                    "Gocardless bank account \"{0}\" of {1} will only be synced from {2}, " +
+                    "since the history of the bank starts {3} days ago."
+                ).format(
+                    data.account, bank, cut, cint(doc.transaction_days)
+                ), title=_("Gocardless"), indicator="orange")
+            
+            if not sync_bank_account(
+                settings, client, bank, doc.bank, "Manual",
+                data.name, data.account, data.account_id,
+                data.bank_account, windows[0][0], windows[-1][1], windows
+            ):
+                error(_(
+                    "There was an error while syncing " +
+                    "Gocardless bank account \"{0}\" of {1} from {2} to {3}."
+                ).format(
+                    data.account, bank, from_date, to_date
+                ), False, "nMar7aW44f")
+                return 0
             
             return 1
     
@@ -760,6 +998,54 @@ def auto_sync():
         sync_banks()
 
 
+# Daily Schedule
+# The pending transactions that have not been settled by a booked one after
+# the expiry set are cancelled, unless they have been allocated.
+def expire_pending_transactions():
+    if not is_enabled():
+        return 0
+    
+    days = cint(get_settings().pending_transactions_expiry)
+    if days <= 0:
+        return 0
+    
+    dt = "Bank Transaction"
+    names = frappe.get_all(
+        dt,
+        fields=["name"],
+        filters={
+            "docstatus": 1,
+            "status": "Pending",
+            "gocardless_fingerprint": ["is", "set"],
+            "date": ["<", add_to_date(
+                datetime.utcnow().strftime(DATE_FORMAT), days=-days, as_string=True
+            )],
+        },
+        pluck="name"
+    )
+    total = 0
+    for name in names:
+        try:
+            doc = frappe.get_doc(dt, name)
+            if flt(doc.allocated_amount) > 0:
+                continue
+            
+            doc.flags.ignore_permissions = True
+            doc.cancel()
+            total += 1
+        except Exception as exc:
+            log_error(exc)
+            error(_(
+                "Unable to cancel the expired pending transaction {0}."
+            ).format(name), False, "Tz6hMwQe4B")
+    
+    if total:
+        clear_doc_cache(dt)
+        log_info("{0} expired pending transactions have been cancelled.".format(total))
+    
+    return total
+
+
 # Daily Schedule
 def update_banks_status():
     if (banks := frappe.get_all(
@@ -809,6 +1095,10 @@ def update_banks_status():
 # Internal
 # Part of Daily Schedule
 def update_bank_accounts_status():
+    if is_circuit_open("accounts"):
+        log_info("Skipping the bank accounts status update since Gocardless is unavailable.")
+        return 0
+    
     if (banks := frappe.get_all(
         _BANK_,
         fields=["name"],
@@ -828,35 +1118,40 @@ def update_bank_accounts_status():
                 "status": ["!=", "Ready"]
             }
         )):
-            client = get_client()
-            for v in accounts:
-                data = client.get_account_data(v["account_id"])
+            client = get_batch_client()
+            accounts_data = client.get_accounts_data([v["account_id"] for v in accounts])
+            updates = []
+            for i, v in enumerate(accounts):
+                data = accounts_data[i]
                 if "error" in data:
                     report_error(data, False)
                     continue
                 
                 if data["status"] != v["status"]:
-                    values = {"status": data["status"]}
-                    
-                    if data["status"] == "Ready":
-                        acc_balances = client.get_account_balances(v["account_id"])
-                        if "error" in acc_balances:
-                            report_error(acc_balances, False)
-                        else:
-                            values.update({"balances": to_json(acc_balances)})
-                    
-                    try:
-                        frappe.db.set_value(
-                            _BANK_ACCOUNT_,
-                            v["name"],
-                            values,
-                            update_modified=False
-                        )
-                    except Exception as exc:
-                        log_error(exc)
-                        error(_(
-                            "Unable to update account status of {0} for {1}"
-                        ).format(v["account"], v["parent"]), False, "5Gg8e9sPEh")
+                    updates.append((v, {"status": data["status"]}))
+            
+            ready = [v["account_id"] for v, values in updates if values["status"] == "Ready"]
+            balances = dict(zip(ready, client.get_accounts_balances(ready))) if ready else {}
+            for v, values in updates:
+                if v["account_id"] in balances:
+                    acc_balances = balances[v["account_id"]]
+                    if "error" in acc_balances:
+                        report_error(acc_balances, False)
+                    else:
+                        values.update({"balances": to_json(acc_balances)})
+                
+                try:
+                    frappe.db.set_value(
+                        _BANK_ACCOUNT_,
+                        v["name"],
+                        values,
+                        update_modified=False
+                    )
+                except Exception as exc:
+                    log_error(exc)
+                    error(_(
+                        "Unable to update account status of {0} for {1}"
+                    ).format(v["account"], v["parent"]), False, "5Gg8e9sPEh")
         
             frappe.publish_realtime(
                 event="gocardless_updated_bank_accounts",
@@ -866,6 +1161,10 @@ def update_bank_accounts_status():
 
 # Internal
 def sync_banks():
+    if is_circuit_open("accounts"):
+        log_info("Skipping the banks sync since Gocardless is unavailable.")
+        return 0
+    
     filters = {
         "disabled": 0,
         "auto_sync": 1,
@@ -898,24 +1197,41 @@ def sync_bank(name, trigger):
             ))
             continue
         
-        if frappe.cache().hget(_SYNC_CACHE_KEY, v.account):
+        if is_syncing(v.account):
             log_info("The bank account {0} of {1} is already being synced.".format(
                 v.account, doc.bank
             ))
             continue
         
-        date_from = None
         date_to = today
+        windows = None
         
-        if v.last_sync:
-            date_from = reformat_date(v.last_sync)
-            if date_from == today:
+        if (date_from := get_sync_start(v)):
+            if date_from >= today:
                 date_from = None
             else:
                 date_from_obj = datetime.strptime(date_from, DATE_FORMAT)
                 date_delta = datetime.strptime(date_to, DATE_FORMAT) - date_from_obj
                 if cint(date_delta.days) > 1:
-                    date_to = add_to_date(date_from_obj, days=1, as_string=True)
+                    # Catch-up mode, the whole missing range is fetched in
+                    # as few requests as the quota left allows.
+                    windows, cut = plan_sync_windows(
+                        date_from, date_to, doc.transaction_days,
+                        get_sync_quota(name, v.account, v.account_id), today
+                    )
+                    if not windows:
+                        log_info((
+                            "The bank account {0} of {1} can not catch up from {2} "
+                            + "since the daily sync limit has been reached."
+                        ).format(v.account, doc.bank, date_from))
+                        continue
+                    
+                    if cut:
+                        log_info((
+                            "The bank account {0} of {1} can only catch up from {2} "
+                            + "instead of {3} since the history of the bank is shorter."
+                        ).format(v.account, doc.bank, cut, date_from))
+                    date_from, date_to = windows[0][0], windows[-1][1]
         
         if not date_from:
             date_from = add_to_date(now, days=-1, as_string=True)
@@ -923,11 +1239,31 @@ def sync_bank(name, trigger):
         if not sync_bank_account(
             settings, client, name, doc.bank, trigger,
             v.name, v.account, v.account_id,
-            v.bank_account, date_from, date_to
+            v.bank_account, date_from, date_to, windows
         ):
             return 0
 
 
+# Internal
+# The sync starts a few days before the latest booked date seen, for the
+# transactions that are booked late, or at the oldest pending date seen, if
+# older. The last sync is only used until the bank account has a watermark.
+def get_sync_start(account):
+    dates = []
+    if account.booked_watermark:
+        dates.append(add_to_date(
+            reformat_date(account.booked_watermark), days=-_SYNC_OVERLAP_DAYS, as_string=True
+        ))
+    if account.pending_watermark:
+        dates.append(reformat_date(account.pending_watermark))
+    if dates:
+        return min(dates)
+    if account.last_sync:
+        return reformat_date(account.last_sync)
+    
+    return None
+
+
 # Internal
 def reformat_date(date: str, def_none=False):
     try:
@@ -972,6 +1308,8 @@ def get_settings():
         "add_customer_info_if_available",
         "create_customer_if_does_not_exist",
         "create_customer_bank_account_if_does_not_exist",
+        "bulk_insert_transactions",
+        "reconcile_pending_transactions",
     ]:
         doc[k] = True if cint(doc[k]) else False
     
@@ -980,11 +1318,7 @@ def get_settings():
 
 
 # Internal
-def sync_bank_account(
-    settings, client, bank, account_bank, trigger,
-    account_name, account, account_id, bank_account,
-    date_from, date_to
-):
+def get_sync_count(bank, account):
     today = datetime.utcnow().strftime(DATE_FORMAT)
     sync_data = frappe.get_all(
         _SYNC_LOG_,
@@ -998,12 +1332,39 @@ def sync_bank_account(
     )
     
     if not isinstance(sync_data, list):
+        return None
+    
+    return len(sync_data)
+
+
+# Internal
+def get_sync_quota(bank, account, account_id):
+    count = get_sync_count(bank, account)
+    if count is None:
+        return 0
+    
+    quota = _SYNC_LIMIT - count
+    left = get_remaining_quota("transactions", account_id)
+    if left is not None:
+        quota = min(quota, left)
+    
+    return max(quota, 0)
+
+
+# Internal
+def sync_bank_account(
+    settings, client, bank, account_bank, trigger,
+    account_name, account, account_id, bank_account,
+    date_from, date_to, windows=None
+):
+    sync_count = get_sync_count(bank, account)
+    if sync_count is None:
         log_info((
             "The sync log data of the bank account {0} that belongs to {1} is invalid."
         ).format(account, account_bank))
         return 0
     
-    if len(sync_data) >= _SYNC_LIMIT:
+    if sync_count >= _SYNC_LIMIT:
         log_info((
             "The synchronization for the bank account {0} "
             + "of {1} has exceeded the allowed limit {2}."
@@ -1032,7 +1393,8 @@ def sync_bank_account(
             account_id=account_id,
             bank_account=bank_account,
             date_from=date_from,
-            date_to=date_to
+            date_to=date_to,
+            windows=windows
         )
     else:
         frappe.enqueue(
@@ -1052,77 +1414,140 @@ def sync_bank_account(
             account_id=account_id,
             bank_account=bank_account,
             date_from=date_from,
-            date_to=date_to
+            date_to=date_to,
+            windows=windows
         )
     
     return 1
 
 
 # Internal
+# The lock holds the time of the last sync checkpoint, as a heartbeat, so the
+# lock left by a worker that died is ignored shortly after instead of blocking
+# the bank account.
+def is_syncing(account):
+    started = frappe.cache().hget(_SYNC_CACHE_KEY, account)
+    if not started or isinstance(started, bool):
+        return False
+    
+    return time.time() - flt(started) < _SYNC_LOCK_EXPIRY
+
+
+# Internal
+# The sync state of the bank account is committed after each spool and each
+# batch of transactions persisted, so a sync that has been interrupted is
+# resumed by the next one, from the window and the row it has reached.
 def sync_bank_account_transactions(
     settings, client, sync_id, bank, acc_bank, trigger,
     account_name, account, account_id, bank_account,
-    date_from, date_to
+    date_from, date_to, windows=None
 ):
-    if frappe.cache().hget(_SYNC_CACHE_KEY, account):
+    if is_syncing(account):
         return 0
     
-    frappe.cache().hset(_SYNC_CACHE_KEY, account, True)
+    frappe.cache().hset(_SYNC_CACHE_KEY, account, time.time())
     
     log_info("Bank account transactions sync for {0} has started.".format(account))
     
-    transactions = client.get_account_transactions(account_id, date_from, date_to)
-    
-    if transactions and "error" in transactions:
-        frappe.cache().hdel(_SYNC_CACHE_KEY, account)
-        report_error(transactions, False)
-        return 0
-    
-    result = _dict({
-        "entries": [],
-        "synced": False,
-    })
+    windows = [list(v) for v in windows or [(date_from, date_to)]]
+    state = get_sync_state(account_name, account_id)
+    if state and trigger != "Auto" and state["windows"] != windows:
+        # A sync requested for another range does not resume the one left.
+        log_info((
+            "The interrupted transactions sync for {0} has been discarded "
+            + "since another range has been requested."
+        ).format(account))
+        remove_spool(state.get("spool", None))
+        set_sync_state(account_name, None)
+        state = None
+    
+    if state:
+        state["account"] = account
+        log_info((
+            "Bank account transactions sync for {0} is resumed from window {1} at row {2}."
+        ).format(account, state["window"] + 1, state["offset"]))
+    else:
+        state = {
+            "sync_id": str(sync_id),
+            "account": account,
+            "account_id": account_id,
+            "windows": windows,
+            "window": 0,
+            "spool": None,
+            "log": None,
+            "rows": 0,
+            "offset": 0,
+            "committed": 0,
+        }
     
+    stored = frappe.db.get_value(
+        _BANK_ACCOUNT_,
+        account_name,
+        ["booked_watermark", "booked_watermark_ids", "pending_watermark"],
+        as_dict=True
+    ) or _dict()
+    # The rows seen by the previous syncs are skipped using the watermark
+    # saved when the sync has started, while the new one is built as the rows
+    # are received and only saved once all the windows are synced.
+    for k in ["seen", "mark"]:
+        if not isinstance(state.get(k, None), dict):
+            state[k] = make_watermark(stored.booked_watermark, stored.booked_watermark_ids)
+    
+    windows = state["windows"]
+    total = len(windows)
+    synced_to = None
     try:
-        if transactions:
-            log_info((
-                "Bank account transactions for {0} has been received from api."
-            ).format(account))
-            for k in ["booked", "pending"]:
-                if (
-                    k in transactions and transactions[k] and
-                    isinstance(transactions[k], list)
-                ):
-                    log_info((
-                        "Processing the {0} transactions for bank account \"{1}\"."
-                    ).format(k, account))
-                    log_info(transactions[k])
-                    
-                    add_transactions(
-                        result, settings, sync_id, bank, acc_bank, trigger,
-                        account, bank_account, k,
-                        client.prepare_entries(transactions.pop(k)),
-                        date_from, date_to
-                    )
-                else:
-                    log_info((
-                        "Skipping the {0} transactions for bank account \"{1}\"."
-                    ).format(k, account))
+        for i in range(state["window"], total):
+            window_from, window_to = windows[i]
+            if total > 1:
+                publish_sync_progress(account, i, total, window_from, window_to)
+            
+            result = sync_bank_account_window(
+                settings, client, sync_id if not i else uuid.uuid4(),
+                bank, acc_bank, trigger, account_name, account, account_id,
+                bank_account, window_from, window_to, state
+            )
+            if result is None:
+                break
+            if result.synced:
+                synced_to = window_to
+            
+            remove_spool(state["spool"])
+            state.update({
+                "window": i + 1,
+                "spool": None,
+                "log": None,
+                "rows": 0,
+                "offset": 0,
+                "committed": 0,
+            })
+            set_sync_state(account_name, state if i + 1 < total else None)
     finally:
+        values = {}
+        if state["window"] >= total:
+            mark = state["mark"]
+            values.update({
+                "booked_watermark": mark["booked"],
+                "booked_watermark_ids": to_json(mark["ids"], ""),
+                "pending_watermark": get_pending_watermark(
+                    mark, stored.pending_watermark, windows[0][0], windows[-1][1]
+                ),
+            })
         
-        if result.synced:
+        if synced_to:
             last_sync = datetime.combine(
-                datetime.strptime(date_to, DATE_FORMAT),
+                datetime.strptime(synced_to, DATE_FORMAT),
                 datetime.utcnow().time()
             ).strftime(DATETIME_FORMAT)
-            values = {"last_sync": last_sync}
+            values.update({"last_sync": last_sync})
             
             acc_balances = client.get_account_balances(account_id)
             if "error" in acc_balances:
                 report_error(acc_balances, False)
             else:
                 values.update({"balances": to_json(acc_balances)})
-            
+        
+        if values:
             frappe.db.set_value(
                 _BANK_ACCOUNT_,
                 account_name,
@@ -1130,70 +1555,444 @@ def sync_bank_account_transactions(
                 update_modified=False
             )
         
-        (frappe.new_doc(_SYNC_LOG_)
+        frappe.cache().hdel(_SYNC_CACHE_KEY, account)
+        
+        clear_doc_cache("Bank Transaction")
+        
+        if total > 1:
+            publish_sync_progress(account, total, total)
+
+
+# Internal
+def get_sync_state(account_name, account_id):
+    state = parse_json(
+        frappe.db.get_value(_BANK_ACCOUNT_, account_name, "sync_state") or "", None
+    )
+    if not state or not isinstance(state, dict):
+        return None
+    
+    if (
+        state.get("account_id", None) != account_id or
+        not state.get("windows", None) or
+        cint(state.get("window", 0)) >= len(state["windows"]) or
+        time.time() - flt(state.get("updated", 0)) > _SYNC_STATE_EXPIRY
+    ):
+        remove_spool(state.get("spool", None))
+        set_sync_state(account_name, None)
+        return None
+    
+    for k in ["window", "rows", "offset", "committed"]:
+        state[k] = cint(state.get(k, 0))
+    
+    return state
+
+
+# Internal
+# The state is committed along with the transactions added before it, so it
+# always points right after the last transaction persisted. Each save also
+# refreshes the sync lock of the bank account.
+def set_sync_state(account_name, state):
+    if state:
+        state["updated"] = time.time()
+        if state.get("account", None):
+            frappe.cache().hset(_SYNC_CACHE_KEY, state["account"], state["updated"])
+    
+    frappe.db.set_value(
+        _BANK_ACCOUNT_,
+        account_name,
+        "sync_state",
+        to_json(state, "") if state else "",
+        update_modified=False
+    )
+    frappe.db.commit()
+
+
+# Internal
+def publish_sync_progress(account, done, total, date_from=None, date_to=None):
+    frappe.publish_realtime(
+        event="gocardless_bank_account_sync_progress",
+        message={
+            "account": account,
+            "done": done,
+            "total": total,
+            "from_date": date_from,
+            "to_date": date_to,
+        },
+        after_commit=False
+    )
+
+
+# Internal
+def sync_bank_account_window(
+    settings, client, sync_id, bank, acc_bank, trigger, account_name,
+    account, account_id, bank_account, date_from, date_to, state
+):
+    if not has_spool(state["spool"]):
+        transactions = client.stream_account_transactions(account_id, date_from, date_to)
+        
+        if isinstance(transactions, dict) and "error" in transactions:
+            report_error(transactions, False)
+            return None
+        
+        spool = "{0}-{1}".format(state["sync_id"], state["window"])
+        try:
+            rows = write_spool(spool, transactions or [])
+        except Exception as exc:
+            log_error(exc)
+            error(_(
+                "Unable to spool the transactions received for bank account \"{0}\"."
+            ).format(account), False, "Wn4cDxTq8L")
+            remove_spool(spool)
+            return None
+        
+        # The sync log is added once the transactions are received, so a
+        # window that is resumed is not counted twice against the limit.
+        log = (frappe.new_doc(_SYNC_LOG_)
             .update({
                 "sync_id": sync_id,
                 "bank": bank,
                 "bank_account": account,
                 "trigger": trigger,
-                "total_transactions": len(result.entries),
+                "total_transactions": 0,
             })
             .insert(ignore_permissions=True, ignore_mandatory=True))
+        state.update({
+            "spool": spool,
+            "log": log.name,
+            "rows": rows,
+            "offset": 0,
+            "committed": 0,
+        })
+        set_sync_state(account_name, state)
+    
+    result = _dict({
+        "entries": [],
+        "synced": False,
+        "stats": {},
+        "parties": get_party_indexes(settings),
+        "party_accounts": {},
+        "settled": set(),
+    })
+    
+    def save(batch):
+        total = add_bank_transactions(
+            result, settings, acc_bank, account, bank_account, batch
+        )
+        save_party_bank_accounts(result, acc_bank)
+        state["offset"] = batch[-1].position + 1
+        state["committed"] += total
+        set_sync_state(account_name, state)
+        return total
+    
+    try:
+        if state["rows"] > state["offset"]:
+            log_info((
+                "Bank account transactions for {0} from {1} to {2} are being processed."
+            ).format(account, date_from, date_to))
+            rows = track(read_spool(state["spool"], state["offset"]), result.stats, "received")
+            rows = normalize(rows, client.prepare_record)
+            rows = number(rows, state["offset"])
+            currencies = get_currencies()
+            rows = validate(rows, lambda row: validate_bank_transaction(
+                settings, account, row, currencies
+            ))
+            rows = track(rows, result.stats, "valid")
+            rows = validate(rows, lambda row: not is_seen(state["seen"], row))
+            rows = watch(rows, lambda row: observe(state["mark"], row))
+            rows = dedupe(rows, get_transactions_lookup(
+                bank_account, date_from, date_to
+            ), _SYNC_BATCH_SIZE)
+            if settings.reconcile_pending_transactions:
+                pending = get_pending_transactions_index(bank_account, date_from, date_to)
+                rows = reconcile(rows, lambda row: reconcile_pending_transaction(
+                    result, bank_account, pending, row
+                ))
+            persist(rows, save, get_sync_batch_size(settings))
+            
+            log_info((
+                "Processed {0} transactions for bank account \"{1}\", {2} are valid, "
+                + "{3} are new and {4} have settled pending ones."
+            ).format(
+                result.stats.get("received", 0), account,
+                result.stats.get("valid", 0), len(result.entries),
+                result.stats.get("reconciled", 0)
+            ))
+    finally:
+        result.synced = state["rows"] > 0
+        # The sync log total is still updated if the bank accounts fail.
+        try:
+            save_party_bank_accounts(result, acc_bank)
+        except Exception as exc:
+            log_error(exc)
         
-        frappe.cache().hdel(_SYNC_CACHE_KEY, account)
+        if state.get("log", None):
+            frappe.db.set_value(
+                _SYNC_LOG_,
+                state["log"],
+                "total_transactions",
+                state["committed"],
+                update_modified=False
+            )
+    
+    return result
+
+
+# Internal
+def get_existing_transaction_keys(bank_account, fieldname, values):
+    filters = {fieldname: ["in", values]}
+    if fieldname != "transaction_id":
+        filters["bank_account"] = bank_account
+    
+    return frappe.get_all(
+        "Bank Transaction",
+        fields=[fieldname],
+        filters=filters,
+        pluck=fieldname
+    )
+
+
+# Internal
+# The keys of the transactions of the bank account around the window, their
+# ids, fingerprints and the keys of the pending ones they have settled, are
+# loaded once, so the duplicates, which are most of
+# the rows when windows overlap, are found without a query. Only the keys that
+# are not known are looked up, since they may belong to transactions out of
+# the window.
+def get_transactions_lookup(bank_account, date_from, date_to):
+    known = set()
+    try:
+        data = frappe.get_all(
+            "Bank Transaction",
+            fields=["transaction_id", "gocardless_fingerprint", "gocardless_pending_key"],
+            filters={
+                "bank_account": bank_account,
+                "date": ["between", [
+                    add_to_date(date_from, days=-_SYNC_PRELOAD_MARGIN, as_string=True),
+                    add_to_date(date_to, days=_SYNC_PRELOAD_MARGIN, as_string=True)
+                ]],
+            },
+            as_list=True,
+            limit_page_length=_SYNC_PRELOAD_LIMIT + 1
+        )
+        if len(data) <= _SYNC_PRELOAD_LIMIT:
+            for tid, fingerprint, pending_key in data:
+                if tid:
+                    known.add(("transaction_id", tid))
+                if fingerprint:
+                    known.add(("gocardless_fingerprint", fingerprint))
+                if (pending_key := load_key(pending_key)):
+                    known.add(pending_key)
+    except Exception as exc:
+        log_error(exc)
+    
+    def get_existing(keys):
+        found = [v for v in keys if v in known]
+        missing = {}
+        for k, v in keys:
+            if (k, v) not in known:
+                missing.setdefault(k, []).append(v)
+        for k, v in missing.items():
+            found.extend((k, x) for x in get_existing_transaction_keys(bank_account, k, v))
+        if missing:
+            found.extend(load_key(v) for v in get_existing_transaction_keys(
+                bank_account, "gocardless_pending_key",
+                [dump_key((k, x)) for k, v in missing.items() for x in v]
+            ))
         
-        clear_doc_cache("Bank Transaction")
+        return found
+    
+    return get_existing
 
 
 # Internal
-def add_transactions(
-    result, settings, sync_id, bank, acc_bank, trigger,
-    account, bank_account, status, transactions,
-    date_from, date_to
-):
-    log_info((
-        "Saving the {0} transactions for bank account \"{1}\"."
-    ).format(status, account))
-    log_info(transactions)
+def get_pending_transactions_index(bank_account, date_from, date_to):
+    try:
+        return make_pending_index(frappe.get_all(
+            "Bank Transaction",
+            fields=[
+                "name", "date", "deposit", "withdrawal", "currency",
+                "party_type", "party", "gocardless_transaction_info",
+                "transaction_id", "gocardless_fingerprint"
+            ],
+            filters={
+                "bank_account": bank_account,
+                "docstatus": 1,
+                "status": "Pending",
+                "gocardless_fingerprint": ["is", "set"],
+                "date": ["between", [
+                    add_to_date(date_from, days=-_SYNC_PRELOAD_MARGIN, as_string=True),
+                    add_to_date(date_to, days=_SYNC_PRELOAD_MARGIN, as_string=True)
+                ]],
+            },
+            limit_page_length=_SYNC_PRELOAD_LIMIT
+        ))
+    except Exception as exc:
+        log_error(exc)
+    
+    return {}
+
+
+# Internal
+# A booked transaction that matches a pending one, often received with a
+# different transaction id, settles the pending one in place instead of
+# being added as a duplicate. The key of the pending one is kept, so it is
+# still found when the pending transaction is received again.
+def reconcile_pending_transaction(result, bank_account, index, row):
+    if row.is_pending:
+        return 1 if any(k in result.settled for k in row.keys) else 0
+    if not index:
+        return 0
     
-    if not isinstance(transactions, list):
-        log_error((
-            "The {0} transactions for bank account \"{1}\" are invalid."
-        ).format(status, account))
+    party = None
+    for dt, data in [("Supplier", row.supplier), ("Customer", row.customer)]:
+        if dt in result.parties and data and "name" in data:
+            if (name := resolve_party(
+                result.parties[dt], data["name"], data.get("account", None)
+            )):
+                party = (dt, name)
+                break
+    
+    if not (pending := match_pending(index, row, party)):
         return 0
     
-    if not len(transactions):
-        log_error((
-            "The {0} transactions for bank account \"{1}\" are empty."
-        ).format(status, account))
+    name = pending["name"]
+    data = make_bank_transaction_data(row, bank_account)
+    data["gocardless_pending_key"] = dump_key(pending["key"])
+    try:
+        frappe.db.set_value("Bank Transaction", name, {
+            k: data[k] for k in [
+                "date",
+                "status",
+                "description",
+                "gocardless_transaction_info",
+                "reference_number",
+                "transaction_id",
+                "gocardless_fingerprint",
+                "gocardless_pending_key",
+            ]
+        })
+    except Exception as exc:
+        log_error(exc)
+        error(_(
+            "Unable to settle the pending transaction {0} of bank account {1}."
+        ).format(name, bank_account), False, "Pk3VnRz7Ye")
         return 0
     
-    result.synced = True
-    for i in range(len(transactions)):
-        new_bank_transaction(
-            result, settings, acc_bank, account, bank_account,
-            transactions.pop(0), status
+    result.settled.add(pending["key"])
+    result.stats["reconciled"] = result.stats.get("reconciled", 0) + 1
+    return 1
+
+
+# Internal
+def get_party_indexes(settings):
+    parties = {}
+    if settings.add_supplier_info_if_available:
+        parties["Supplier"] = get_party_index("Supplier")
+    if settings.add_customer_info_if_available:
+        parties["Customer"] = get_party_index("Customer")
+    
+    return parties
+
+
+# Internal
+def get_sync_batch_size(settings):
+    if settings.bulk_insert_transactions:
+        return cint(settings.bulk_insert_batch_size) or _SYNC_BATCH_SIZE
+    
+    return _SYNC_BATCH_SIZE
+
+
+# Internal
+def add_bank_transactions(result, settings, acc_bank, account, bank_account, batch):
+    if settings.bulk_insert_transactions and len(batch) > 1:
+        total = insert_bank_transactions(
+            result, settings, acc_bank, account, bank_account, batch
         )
+        if total is not None:
+            return total
+        
+        log_info((
+            "Bulk insert of {0} transactions for bank account \"{1}\" failed, "
+            + "adding them one at a time."
+        ).format(len(batch), account))
+    
+    total = 0
+    for row in batch:
+        total += new_bank_transaction(
+            result, settings, acc_bank, account, bank_account, row
+        )
+    
+    return total
 
 
 # Internal
-def new_bank_transaction(
-    result, settings, acc_bank, account, bank_account, data, status
-):
-    if "transaction_id" not in data:
+# The batch is inserted submitted with multi-row statements, and it is rolled
+# back as a whole on any error so that it can be added again one document at
+# a time. Each document is validated in memory first, with the validate
+# methods and hooks of Bank Transaction, so a row that fails, like one in a
+# currency other than the bank account one, sends the batch to the per
+# document path. It is still not equivalent to that path, since the on_submit
+# hooks are skipped, so the status and the matching that ERPNext sets on
+# submit are not applied, which is why the mode is off by default.
+def insert_bank_transactions(result, settings, acc_bank, account, bank_account, batch):
+    dt = "Bank Transaction"
+    savepoint = "gocardless_bulk_insert"
+    company = frappe.get_cached_value("Bank Account", bank_account, "company")
+    user = frappe.session.user
+    now = now_datetime()
+    docs = []
+    try:
+        frappe.db.savepoint(savepoint)
+        for row in batch:
+            entry_data = make_bank_transaction_data(row, bank_account)
+            handle_transaction_supplier(settings, entry_data, row, result)
+            handle_transaction_customer(settings, entry_data, row, result)
+            
+            doc = frappe.new_doc(dt).update(entry_data)
+            doc.company = company
+            doc.run_method("before_validate")
+            doc.run_method("validate")
+            doc.update({
+                "docstatus": 1,
+                "allocated_amount": 0,
+                "unallocated_amount": abs(row.withdrawal - row.deposit),
+                "owner": user,
+                "modified_by": user,
+                "creation": now,
+                "modified": now,
+            })
+            set_new_name(doc)
+            docs.append(doc.get_valid_dict(sanitize=False, convert_dates_to_str=True))
+        
+        fields = list(docs[0])
+        frappe.db.bulk_insert(dt, fields, [[v.get(f) for f in fields] for v in docs])
+    except Exception as exc:
+        frappe.db.rollback(save_point=savepoint)
+        log_error(exc)
+        # The parties created by the batch have been rolled back too.
+        clear_party_index()
+        result.parties = get_party_indexes(settings)
+        return None
+    
+    result.entries.extend(v["name"] for v in docs)
+    return len(docs)
+
+
+# Internal
+def validate_bank_transaction(settings, account, row, currencies):
+    status = row.status
+    if not row.transaction_id:
         if settings.only_sync_transactions_with_id:
             log_info(_(
                 "The new {0} transaction for bank account \"{1}\" has been ignored " +
                 "since it has no transaction id."
             ).format(status, account))
-            log_info(data)
+            log_info(row.as_dict())
             return 0
         else:
-            data["transaction_id"] = uuid.UUID(hashlib.sha256(
-                to_json(data, "").encode("utf-8")
-            ).hexdigest()[::2])
+            row.transaction_id = make_transaction_id(row.fingerprint)
     
-    if "date" not in data:
+    if not row.date:
         if not settings.ignore_transactions_without_date:
             error(_(
                 "The new {0} transaction for bank account \"{1}\" has no date."
@@ -1202,10 +2001,10 @@ def new_bank_transaction(
             "The new {0} transaction for bank account \"{1}\" has been ignored "
             + "since it has no date."
         ).format(status, account))
-        log_info(data)
+        log_info(row.as_dict())
         return 0
     
-    if "amount" not in data:
+    if row.amount is None:
         if not settings.ignore_transactions_without_amount:
             error(_(
                 "The new {0} transaction for bank account \"{1}\" has no amount value."
@@ -1214,10 +2013,10 @@ def new_bank_transaction(
             "The new {0} transaction for bank account \"{1}\" has been ignored "
             + "since it has no amount."
         ).format(status, account))
-        log_info(data)
+        log_info(row.as_dict())
         return 0
     
-    if "currency" not in data:
+    if not row.currency:
         if not settings.ignore_transactions_without_currency:
             error(_(
                 "The new {0} transaction for bank account \"{1}\" "
@@ -1227,82 +2026,85 @@ def new_bank_transaction(
             "The new {0} transaction for bank account \"{1}\" has been ignored "
             + "since it has no currency."
         ).format(status, account))
-        log_info(data)
+        log_info(row.as_dict())
         return 0
     
-    if not frappe.db.exists("Currency", data["currency"]):
+    if row.currency not in currencies:
         if not settings.ignore_transactions_without_existing_currency:
             error(_(
                 "The new {0} transaction currency ({1}) "
                 + "for bank account \"{2}\" does not exist."
-            ).format(status, data["currency"], account), False, "G2SLqkm9Kw")
+            ).format(status, row.currency, account), False, "G2SLqkm9Kw")
         log_info(_(
             "The new {0} transaction for bank account \"{1}\" has been ignored " +
             "since it has no existing currency."
         ).format(status, account))
-        log_info(data)
+        log_info(row.as_dict())
         return 0
     
-    if not frappe.db.exists("Currency", {
-        "currency_name": data["currency"],
-        "enabled": 1
-    }):
+    if not currencies[row.currency]:
         if settings.ignore_transactions_without_enabled_currency:
             return 0
     
-    data["amount"] = flt(data["amount"])
-    if data["amount"] >= 0:
-        debit = abs(data["amount"])
-        credit = 0
-    else:
-        debit = 0
-        credit = abs(data["amount"])
-    
-    status = "Pending" if status == "pending" else "Settled"
+    return 1
+
+
+# Internal
+def new_bank_transaction(
+    result, settings, acc_bank, account, bank_account, row
+):
+    status = "Pending" if row.is_pending else "Settled"
     dt = "Bank Transaction"
     
-    if not frappe.db.exists(dt, {"transaction_id": data["transaction_id"]}):
-        try:
-            entry_data = _dict({
-                "date": reformat_date(data["date"]),
-                "status": status,
-                "bank_account": bank_account,
-                "deposit": debit,
-                "withdrawal": credit,
-                "currency": data["currency"],
-                "description": data.get("description", ""),
-                "gocardless_transaction_info": data.get("information", ""),
-                "reference_number": data.get("reference_number", ""),
-                "transaction_id": data["transaction_id"],
-            })
-            
-            handle_transaction_supplier(settings, entry_data, acc_bank, data)
-            handle_transaction_customer(settings, entry_data, acc_bank, data)
-            
-            doc = (frappe.new_doc(dt)
-                .update(entry_data)
-                .insert(ignore_permissions=True, ignore_mandatory=True)
-                .submit())
-            
-            result.entries.append(doc.name)
-        except Exception as exc:
-            log_error(exc)
-            error(_(
-                "Unable to add new {} transaction for {} bank account."
-            ).format(status, account), False, "9HS6PbCfLs")
+    try:
+        entry_data = make_bank_transaction_data(row, bank_account)
+        
+        handle_transaction_supplier(settings, entry_data, row, result)
+        handle_transaction_customer(settings, entry_data, row, result)
+        
+        doc = (frappe.new_doc(dt)
+            .update(entry_data)
+            .insert(ignore_permissions=True, ignore_mandatory=True)
+            .submit())
+        
+        result.entries.append(doc.name)
+        return 1
+    except Exception as exc:
+        log_error(exc)
+        error(_(
+            "Unable to add new {} transaction for {} bank account."
+        ).format(status, account), False, "9HS6PbCfLs")
+    
+    return 0
+
+
+# Internal
+def make_bank_transaction_data(row, bank_account):
+    return _dict({
+        "date": row.posting_date or reformat_date(row.date),
+        "status": "Pending" if row.is_pending else "Settled",
+        "bank_account": bank_account,
+        "deposit": row.deposit,
+        "withdrawal": row.withdrawal,
+        "currency": row.currency,
+        "description": row.description,
+        "gocardless_transaction_info": row.information,
+        "reference_number": row.reference_number,
+        "transaction_id": row.transaction_id,
+        "gocardless_fingerprint": row.fingerprint,
+    })
 
 
 # Internal
-def handle_transaction_supplier(settings, entry, acc_bank, data):
+def handle_transaction_supplier(settings, entry, row, result):
     if (
         settings.add_supplier_info_if_available and
-        "supplier" in data and data["supplier"] and
-        "name" in data["supplier"]
+        row.supplier and "name" in row.supplier
     ):
         dt = "Supplier"
-        name = data["supplier"]["name"]
+        name = row.supplier["name"]
         ignore_supplier = False
-        if not frappe.db.exists(dt, {"supplier_name": name}):
+        if not (party := resolve_party(result.parties[dt], name, row.supplier.get("account", None))):
             if (
                 settings.create_supplier_if_does_not_exist and
                 settings.supplier_default_group
@@ -1317,6 +2119,7 @@ def handle_transaction_supplier(settings, entry, acc_bank, data):
                         .insert(ignore_permissions=True, ignore_mandatory=True))
                     entry.party_type = dt
                     entry.party = doc.name
+                    add_party(result.parties[dt], name, doc.name)
                     
                     clear_doc_cache(dt)
                 except Exception as exc:
@@ -1329,38 +2132,26 @@ def handle_transaction_supplier(settings, entry, acc_bank, data):
                 
         else:
             entry.party_type = dt
-            entry.party = frappe.db.get_value(dt, {"supplier_name": name}, "name")
-            if isinstance(entry.party, list):
-                entry.party = entry.party.pop()
+            entry.party = party
         
-        if not ignore_supplier:
-            if "account" in data["supplier"] and data["supplier"]["account"]:
-                if (acc_name := add_party_bank_account(
-                    name, dt, acc_bank, data["supplier"]["account"],
-                    settings.create_supplier_bank_account_if_does_not_exist
-                )):
-                    if entry.party:
-                        frappe.db.set_value(
-                            dt,
-                            entry.party,
-                            "default_bank_account",
-                            acc_name
-                        )
-                        clear_doc_cache(dt)
+        if not ignore_supplier and row.supplier.get("account", None):
+            queue_party_bank_account(
+                result, name, dt, entry.party, row.supplier["account"],
+                settings.create_supplier_bank_account_if_does_not_exist
+            )
 
 
 # Internal
-def handle_transaction_customer(settings, entry, acc_bank, data):
+def handle_transaction_customer(settings, entry, row, result):
     if (
         not entry.party_type and not entry.party and
         settings.add_customer_info_if_available and
-        "customer" in data and data["customer"] and
-        "name" in data["customer"]
+        row.customer and "name" in row.customer
     ):
         dt = "Customer"
-        name = data["customer"]["name"]
+        name = row.customer["name"]
         ignore_customer = False
-        if not frappe.db.exists(dt, {"customer_name": name}):
+        if not (party := resolve_party(result.parties[dt], name, row.customer.get("account", None))):
             if (
                 settings.create_customer_if_does_not_exist and
                 settings.customer_default_group and
@@ -1377,6 +2168,7 @@ def handle_transaction_customer(settings, entry, acc_bank, data):
                         .insert(ignore_permissions=True, ignore_mandatory=True))
                     entry.party_type = dt
                     entry.party = doc.name
+                    add_party(result.parties[dt], name, doc.name)
                     
                     clear_doc_cache(dt)
                 except Exception as exc:
@@ -1388,68 +2180,120 @@ def handle_transaction_customer(settings, entry, acc_bank, data):
                 ignore_customer = True
         else:
             entry.party_type = dt
-            entry.party = frappe.db.get_value(dt, {"customer_name": name}, "name")
-            if isinstance(entry.party, list):
-                entry.party = entry.party.pop()
+            entry.party = party
         
-        if not ignore_customer:
-            if "account" in data["customer"] and data["customer"]["account"]:
-                if (acc_name := add_party_bank_account(
-                    name, dt, acc_bank, data["customer"]["account"],
-                    settings.create_customer_bank_account_if_does_not_exist
-                )):
-                    if entry.party:
-                        frappe.db.set_value(
-                            dt,
-                            entry.party,
-                            "default_bank_account",
-                            acc_name
-                        )
-                        clear_doc_cache(dt)
+        if not ignore_customer and row.customer.get("account", None):
+            queue_party_bank_account(
+                result, name, dt, entry.party, row.customer["account"],
+                settings.create_customer_bank_account_if_does_not_exist
+            )
 
 
 # Internal
-def add_party_bank_account(party, party_type, acc_bank, account, create_if_not_exist):
-    dt = "Bank Account"
-    bank_acc_name = make_bank_account_name(party, acc_bank)
+def queue_party_bank_account(result, party, party_type, party_name, account, create_if_not_exist):
+    result.party_accounts[(party_type, party)] = _dict({
+        "party": party,
+        "party_type": party_type,
+        "party_name": party_name,
+        "account": account,
+        "create": create_if_not_exist,
+    })
+
+
+# Internal
+# The party bank accounts found in the transactions of a sync are saved once
+# at the end, only writing the accounts and the parties default bank account
+# that have changed.
+def save_party_bank_accounts(result, acc_bank):
+    if not result.party_accounts:
+        return 0
     
-    iban = account
-    if iban and not is_valid_IBAN(iban):
-        iban = ""
+    dt = "Bank Account"
+    accounts = {}
+    for v in result.party_accounts.values():
+        iban = v.account
+        if iban and not is_valid_IBAN(iban):
+            iban = ""
+        accounts[make_bank_account_name(v.party, acc_bank)] = (v, {
+            "iban": iban,
+            "party_type": v.party_type,
+            "party": v.party,
+        })
     
-    if not frappe.db.exists(dt, bank_acc_name):
-        if create_if_not_exist:
+    result.party_accounts = {}
+    existing = {
+        v["name"]: v for v in frappe.get_all(
+            dt,
+            fields=["name", "iban", "party_type", "party"],
+            filters={"name": ["in", list(accounts)]},
+            limit_page_length=0
+        )
+    }
+    saved = 0
+    updates = {}
+    defaults = {}
+    for bank_acc_name, (v, values) in accounts.items():
+        if bank_acc_name in existing:
+            row = existing[bank_acc_name]
+            if any(row[k] != values[k] for k in values):
+                updates[bank_acc_name] = values
+        elif v.create:
             try:
                 (frappe.new_doc(dt)
                     .update({
-                        "account_name": party,
+                        "account_name": v.party,
                         "bank": acc_bank,
-                        "iban": iban,
-                        "party_type": party_type,
-                        "party": party,
                     })
+                    .update(values)
                     .insert(ignore_permissions=True, ignore_mandatory=True))
-                return bank_acc_name
+                saved += 1
             except Exception as exc:
                 log_error(exc)
                 error(_(
                     "Unable to create new party bank account {}."
                 ).format(bank_acc_name), False, "hCkgTvEW5f")
-    else:
+                continue
+        else:
+            continue
+        
+        if v.party_name:
+            defaults.setdefault(v.party_type, {})[v.party_name] = bank_acc_name
+    
+    if updates:
         try:
-            frappe.db.set_value(dt, bank_acc_name, {
-                "iban": iban,
-                "party_type": party_type,
-                "party": party,
-            })
-            return bank_acc_name
+            frappe.db.bulk_update(dt, updates)
+            saved += len(updates)
         except Exception as exc:
             log_error(exc)
             error(_(
-                "Unable to update party bank account {}."
-            ).format(bank_acc_name), False, "Fj5qbnFW2B")
+                "Unable to update party bank accounts {}."
+            ).format(", ".join(updates)), False, "Fj5qbnFW2B")
+    
+    for party_type, values in defaults.items():
+        changed = {
+            v["name"]: {"default_bank_account": values[v["name"]]}
+            for v in frappe.get_all(
+                party_type,
+                fields=["name", "default_bank_account"],
+                filters={"name": ["in", list(values)]},
+                limit_page_length=0
+            )
+            if v["default_bank_account"] != values[v["name"]]
+        }
+        if changed:
+            try:
+                frappe.db.bulk_update(party_type, changed)
+                clear_doc_cache(party_type)
+            except Exception as exc:
+                log_error(exc)
     
-    clear_doc_cache(dt)
+    # The caches are only cleared when a bank account has been written, since
+    # this runs after every batch of the sync.
+    if saved:
+        clear_doc_cache(dt)
+        clear_party_index()
+    
+    return saved
 
 
 # Internal
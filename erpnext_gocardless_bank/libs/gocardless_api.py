@@ -75,6 +75,17 @@ class GocardlessApi:
         return uri
     
     
+    rate_limit_scopes = ["balances", "details", "transactions"]
+    rate_limit_headers = {
+        "limit": "HTTP_X_RATELIMIT_LIMIT",
+        "remaining": "HTTP_X_RATELIMIT_REMAINING",
+        "reset": "HTTP_X_RATELIMIT_RESET",
+        "account_limit": "HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_LIMIT",
+        "account_remaining": "HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_REMAINING",
+        "account_reset": "HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_RESET"
+    }
+    
+    
     transactions = {
         "main": {
             "bankTransactionCode": "reference_number",
@@ -119,12 +130,25 @@ class GocardlessApi:
             "debtorAccount",
             "ultimateDebtor"
         ],
+        "party_keys": {
+            "creditorName": "Creditor Name",
+            "creditorAccount": "Creditor Account",
+            "debtorName": "Debtor Name",
+            "debtorAccount": "Debtor Account"
+        },
         "keys": {
             "bookingDate": "Booking Date",
             "bookingDateTime": "Booking DateTime",
             "valueDate": "Value Date",
             "valueDateTime": "Value DateTime"
         },
+        "references": [
+            "endToEndId",
+            "entryReference",
+            "internalTransactionId",
+            "mandateId",
+            "checkId"
+        ],
         "exchange_keys": {
             "sourceCurrency": "From",
             "exchangeRate": "Rate",
@@ -136,100 +160,28 @@ class GocardlessApi:
     }
     
     
+    # Each key costs a single lookup in the handlers table that is compiled
+    # from the transactions mapping once. The prepared entry is built as a new
+    # dict, with the keys that are kept first and the prepared ones after, in
+    # the same order as when the entry used to be prepared in place. The
+    # information collected is also filled into info, when given.
     @staticmethod
-    def prepare_transactions(transactions):
-        for entry in transactions:
+    def prepare_transaction(entry, info=None):
+        if info is None:
             info = {}
-            for k in list(entry):
-                ek = "main"
-                if k in GocardlessApi.transactions[ek]:
-                    entry[GocardlessApi.transactions[ek][k]] = entry.pop(k)
-                    continue
-                
-                ek = "date"
-                if k in GocardlessApi.transactions[ek]:
-                    val = entry.pop(k)
-                    if ek not in entry and val:
-                        entry[ek] = val
-                    
-                    if (
-                        ek in entry and val and
-                        k in GocardlessApi.transactions["keys"]
-                    ):
-                        info[GocardlessApi.transactions["keys"][k]] = val
-                    
-                    continue
-                
-                ek = "description"
-                if k in GocardlessApi.transactions[ek]:
-                    val = entry.pop(k)
-                    if ek not in entry and val:
-                        if isinstance(val, list):
-                            val = val.pop(0)
-                        if isinstance(val, str) and val:
-                            entry[ek] = val
-                    
-                    if (
-                        ek in entry and val and
-                        k in GocardlessApi.transactions["keys"]
-                    ):
-                        info[GocardlessApi.transactions["keys"][k]] = val
-                    
-                    continue
-                
-                if k in GocardlessApi.transactions["merge"]:
-                    val = entry.pop(k)
-                    if val:
-                        entry.update(val)
-                    
-                    continue
-                
-                ek = "information"
-                if k in GocardlessApi.transactions[ek]:
-                    val = entry.pop(k)
-                    if val:
-                        if k == "currencyExchange" and isinstance(val, dict):
-                            val = GocardlessApi.prepare_currency_exchange(val)
-                        
-                        info[GocardlessApi.transactions[ek][k]] = val
-                    
-                    continue
-                
-                ek = "supplier"
-                if k in GocardlessApi.transactions[ek]:
-                    val = entry.pop(k)
-                    if ek not in entry:
-                        entry[ek] = {}
-                    
-                    nk = k[8:].lower()
-                    entry[ek][nk] = val
-                    
-                    if isinstance(val, dict):
-                        if val:
-                            entry[ek][nk] = next(iter(val.values()))
-                        else:
-                            del entry[ek][nk]
-                    
-                    continue
-                
-                ek = "customer"
-                if k in GocardlessApi.transactions[ek]:
-                    val = entry.pop(k)
-                    if ek not in entry:
-                        entry[ek] = {}
-                    
-                    nk = k[6:].lower()
-                    entry[ek][nk] = val
-                    
-                    if isinstance(val, dict):
-                        if val:
-                            entry[ek][nk] = next(iter(val.values()))
-                        else:
-                            del entry[ek][nk]
-            
-            entry["information"] = to_pretty_json(info, "")
+        data = {}
+        prepared = {}
+        handlers = GocardlessApi.transaction_handlers
+        for k, val in entry.items():
+            handler = handlers.get(k)
+            if handler:
+                handler(prepared, val, info)
+            else:
+                data[k] = val
         
-        return transactions
+        data.update(prepared)
+        data["information"] = to_pretty_json(info, "")
+        return data
     
     
     @staticmethod
@@ -304,4 +256,95 @@ class GocardlessApi:
         elif "country" in data:
             err["message"] = data["country"][0]
         
-        return err
\ No newline at end of file
+        return err
+
+
+def _main_handler(key):
+    def handler(entry, val, info):
+        entry[key] = val
+    
+    return handler
+
+
+def _date_handler(info_key):
+    def handler(entry, val, info):
+        if "date" not in entry and val:
+            entry["date"] = val
+        
+        if info_key and val and "date" in entry:
+            info[info_key] = val
+    
+    return handler
+
+
+def _description_handler(info_key):
+    def handler(entry, val, info):
+        if "description" not in entry and val:
+            if isinstance(val, list):
+                val = val.pop(0)
+            if isinstance(val, str) and val:
+                entry["description"] = val
+        
+        if info_key and val and "description" in entry:
+            info[info_key] = val
+    
+    return handler
+
+
+def _merge_handler(entry, val, info):
+    if val:
+        entry.update(val)
+
+
+def _information_handler(info_key, is_exchange):
+    def handler(entry, val, info):
+        if val:
+            if is_exchange and isinstance(val, dict):
+                val = GocardlessApi.prepare_currency_exchange(val)
+            
+            info[info_key] = val
+    
+    return handler
+
+
+def _party_handler(party, key, info_key):
+    def handler(entry, val, info):
+        if party not in entry:
+            entry[party] = {}
+        
+        if isinstance(val, dict):
+            if val:
+                entry[party][key] = next(iter(val.values()))
+        else:
+            entry[party][key] = val
+        
+        if info_key and entry[party].get(key, None):
+            info[info_key] = entry[party][key]
+    
+    return handler
+
+
+# Compiles the transactions mapping into a key to handler table. The groups
+# are added in reverse order of precedence, so a key that belongs to more
+# than one group is handled by the first group, as it used to be.
+def _compile_transaction_handlers(mapping):
+    handlers = {}
+    for k in mapping["customer"]:
+        handlers[k] = _party_handler("customer", k[6:].lower(), mapping["party_keys"].get(k, None))
+    for k in mapping["supplier"]:
+        handlers[k] = _party_handler("supplier", k[8:].lower(), mapping["party_keys"].get(k, None))
+    for k, v in mapping["information"].items():
+        handlers[k] = _information_handler(v, k == "currencyExchange")
+    for k in mapping["merge"]:
+        handlers[k] = _merge_handler
+    for k in mapping["description"]:
+        handlers[k] = _description_handler(mapping["keys"].get(k, None))
+    for k in mapping["date"]:
+        handlers[k] = _date_handler(mapping["keys"].get(k, None))
+    for k, v in mapping["main"].items():
+        handlers[k] = _main_handler(v)
+    
+    return handlers
+
+
+GocardlessApi.transaction_handlers = _compile_transaction_handlers(GocardlessApi.transactions)
@@ -0,0 +1,125 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from bisect import bisect_left
+import time
+import zlib
+
+import frappe
+from frappe.utils import cint
+
+from .gocardless_common import log_error, parse_json, to_json
+
+
+_BANKS_CACHE_KEY = "gocardless_banks"
+_BANKS_CACHE_EXPIRY = 7 * 86400
+_BANKS_CACHE_REFRESH = 86400
+_BANKS_FIELDS = ["id", "name", "bic", "transaction_total_days"]
+_BANKS_INDEX = {}
+
+
+def make_banks_key(country=None, pay_option=False):
+    return "{0}|{1}|{2}".format(
+        _BANKS_CACHE_KEY, country or "all", 1 if pay_option else 0
+    )
+
+
+# The institutions list is stored compressed, with the time it was fetched
+# so that it can be refreshed in the background once it gets old, while the
+# stale list is still served until the refresh is done.
+def cache_banks(country, pay_option, banks):
+    key = make_banks_key(country, pay_option)
+    cache = {
+        "ts": time.time(),
+        "data": zlib.compress(to_json(banks, b"[]", as_bytes=True))
+    }
+    frappe.cache().set_value(key, cache, expires_in_sec=_BANKS_CACHE_EXPIRY)
+    return build_banks_index(key, cache)
+
+
+def get_banks_index(country=None, pay_option=False):
+    key = make_banks_key(country, pay_option)
+    cache = frappe.cache().get_value(key)
+    if not cache or not isinstance(cache, dict) or "data" not in cache:
+        _BANKS_INDEX.pop(key, None)
+        return None
+    
+    index = _BANKS_INDEX.get(key)
+    if index and index["ts"] == cache["ts"]:
+        return index
+    
+    return build_banks_index(key, cache)
+
+
+def is_banks_index_stale(index):
+    return time.time() - index["ts"] > _BANKS_CACHE_REFRESH
+
+
+def build_banks_index(key, cache):
+    try:
+        banks = parse_json(zlib.decompress(cache["data"]), [])
+    except Exception as exc:
+        log_error({"error": "Unable to load the cached banks list", "exception": str(exc)})
+        banks = []
+    
+    if not isinstance(banks, list):
+        banks = []
+    
+    banks = [v for v in banks if isinstance(v, dict) and v.get("id") and v.get("name")]
+    entries = [{k: v.get(k, "") for k in _BANKS_FIELDS} for v in banks]
+    names = []
+    words = []
+    ids = []
+    bics = []
+    for i, v in enumerate(entries):
+        name = str(v["name"]).lower()
+        names.append((name, i))
+        words.extend((w, i) for w in set(name.split()[1:]))
+        ids.append((str(v["id"]).lower(), i))
+        if v["bic"]:
+            bics.append((str(v["bic"]).lower(), i))
+    
+    index = {
+        "ts": cache["ts"],
+        "banks": banks,
+        "entries": entries,
+        "names": sorted(names),
+        "words": sorted(words),
+        "ids": sorted(ids),
+        "bics": sorted(bics),
+    }
+    _BANKS_INDEX[key] = index
+    return index
+
+
+def search_banks_index(index, query=None, limit=20, offset=0):
+    limit = cint(limit)
+    offset = max(cint(offset), 0)
+    query = str(query or "").strip().lower()
+    if not query:
+        matches = [i for _, i in index["names"]]
+    else:
+        matches = []
+        found = set()
+        for k in ["ids", "bics", "names", "words"]:
+            for i in _prefix_search(index[k], query):
+                if i not in found:
+                    found.add(i)
+                    matches.append(i)
+    
+    total = len(matches)
+    matches = matches[offset:offset + limit] if limit > 0 else matches[offset:]
+    return {
+        "total": total,
+        "data": [index["entries"][i] for i in matches]
+    }
+
+
+def _prefix_search(items, prefix):
+    pos = bisect_left(items, (prefix, -1))
+    while pos < len(items) and items[pos][0].startswith(prefix):
+        yield items[pos][1]
+        pos += 1
@@ -0,0 +1,45 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from frappe.utils import cint
+
+
+_CONCURRENCY = 6
+
+
+# Base of the connectors that fetch the data of many bank accounts at once.
+# The subclass implements run(calls), where each call is a tuple of
+# a connector method name and its arguments, and returns the results in
+# the same order of the calls.
+class BatchGocardlessConnector:
+    def __init__(self, client, concurrency=None):
+        self.client = client
+        self.concurrency = cint(concurrency) if cint(concurrency) > 0 else _CONCURRENCY
+    
+    
+    def get_accounts_info(self, accounts):
+        results = self.run([
+            (method, account_id)
+            for account_id in accounts
+            for method in ["get_account_data", "get_account_balances", "get_account_details"]
+        ])
+        return [
+            {
+                "id": account_id,
+                "data": results[i * 3],
+                "balances": results[i * 3 + 1],
+                "details": results[i * 3 + 2],
+            }
+            for i, account_id in enumerate(accounts)
+        ]
+    
+    
+    def get_accounts_data(self, accounts):
+        return self.run([("get_account_data", account_id) for account_id in accounts])
+    
+    
+    def get_accounts_balances(self, accounts):
+        return self.run([("get_account_balances", account_id) for account_id in accounts])
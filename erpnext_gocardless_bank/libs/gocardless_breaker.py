@@ -0,0 +1,151 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import time
+
+import frappe
+
+from .gocardless_common import log_error
+
+
+_CIRCUIT_CACHE_KEY = "gocardless_circuit"
+_GLOBAL_FAMILY = "global"
+_FAMILY_THRESHOLD = 5
+_GLOBAL_THRESHOLD = 10
+_COOLDOWN = 60
+_MAX_COOLDOWN = 1800
+_PROBE_TIMEOUT = 60
+
+
+# Returns the seconds left before a request is allowed by all the circuits
+# given. Once the cooldown is over, a circuit is half-open and only one probe
+# request is let through until it succeeds or fails. The probes are only
+# claimed once all the circuits allow the request, so a blocked circuit never
+# holds the probe of another one.
+_ALLOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local probes = {}
+for i, key in ipairs(KEYS) do
+    local opened = tonumber(redis.call("HGET", key, "open_until") or 0)
+    if opened > 0 then
+        local probe = tonumber(redis.call("HGET", key, "probe_until") or 0)
+        if now < opened then
+            wait = math.max(wait, opened - now)
+        elseif probe > now then
+            wait = math.max(wait, probe - now)
+        else
+            table.insert(probes, key)
+        end
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(probes) do
+    redis.call("HSET", key, "probe_until", tostring(now + tonumber(ARGV[2])))
+end
+return "0"
+"""
+
+
+# Opens the circuit after the threshold of consecutive failures, or reopens
+# it with a doubled cooldown when a half-open probe fails.
+_FAILURE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local failures = redis.call("HINCRBY", KEYS[1], "failures", 1)
+local opened = tonumber(redis.call("HGET", KEYS[1], "open_until") or 0)
+if (opened == 0 and failures >= tonumber(ARGV[2])) or (opened > 0 and now >= opened) then
+    local cooldown = tonumber(redis.call("HGET", KEYS[1], "cooldown") or 0)
+    if cooldown <= 0 then
+        cooldown = tonumber(ARGV[3])
+    else
+        cooldown = math.min(cooldown * 2, tonumber(ARGV[4]))
+    end
+    redis.call(
+        "HSET", KEYS[1], "open_until", tostring(now + cooldown),
+        "cooldown", tostring(cooldown), "probe_until", "0"
+    )
+end
+redis.call("EXPIRE", KEYS[1], 86400)
+return failures
+"""
+
+
+_STATE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local opened = tonumber(redis.call("HGET", KEYS[1], "open_until") or 0)
+local probe = tonumber(redis.call("HGET", KEYS[1], "probe_until") or 0)
+if opened > now or probe > now then
+    return 1
+end
+return 0
+"""
+
+
+_RESET_SCRIPT = """
+return redis.call("DEL", unpack(KEYS))
+"""
+
+
+def get_family(uri):
+    return uri.split("/", 1)[0].split("?", 1)[0] or _GLOBAL_FAMILY
+
+
+def make_key(family):
+    return frappe.cache().make_key(f"{_CIRCUIT_CACHE_KEY}|{family}")
+
+
+def check(family=None):
+    keys = [make_key(key) for key in [family, _GLOBAL_FAMILY] if key]
+    try:
+        wait = frappe.cache().eval(
+            _ALLOW_SCRIPT, len(keys), *keys, time.time(), _PROBE_TIMEOUT
+        )
+        if isinstance(wait, bytes):
+            wait = wait.decode()
+        if float(wait) > 0:
+            return float(wait)
+    except Exception as exc:
+        log_error({"info": "Gocardless circuit breaker is unavailable", "exception": str(exc)})
+    
+    return 0
+
+
+# The circuit is considered open while its cooldown is running or while a
+# half-open probe is in flight, so schedulers can skip enqueueing jobs that
+# would only be short-circuited.
+def is_open(family=None):
+    try:
+        for key in [family, _GLOBAL_FAMILY]:
+            if key and frappe.cache().eval(_STATE_SCRIPT, 1, make_key(key), time.time()):
+                return True
+    except Exception as exc:
+        log_error({"info": "Gocardless circuit breaker is unavailable", "exception": str(exc)})
+    
+    return False
+
+
+def record_success(family=None):
+    keys = [make_key(_GLOBAL_FAMILY)]
+    if family:
+        keys.append(make_key(family))
+    try:
+        frappe.cache().eval(_RESET_SCRIPT, len(keys), *keys)
+    except Exception as exc:
+        log_error({"info": "Unable to reset the Gocardless circuit breaker", "exception": str(exc)})
+
+
+def record_failure(family=None):
+    try:
+        for key, threshold in [(family, _FAMILY_THRESHOLD), (_GLOBAL_FAMILY, _GLOBAL_THRESHOLD)]:
+            if key:
+                frappe.cache().eval(
+                    _FAILURE_SCRIPT, 1, make_key(key),
+                    time.time(), threshold, _COOLDOWN, _MAX_COOLDOWN
+                )
+    except Exception as exc:
+        log_error({"info": "Unable to update the Gocardless circuit breaker", "exception": str(exc)})
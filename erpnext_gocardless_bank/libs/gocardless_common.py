@@ -12,6 +12,16 @@ from frappe import _
 from erpnext_gocardless_bank import __production__
 from .log_formatter import get_logger
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
 
 _LOGGER_ERROR = None
 _LOGGER_INFO = None
@@ -20,6 +30,39 @@ if not __production__:
     _LOGGER_INFO = get_logger("info")
 
 
+# The fastest json library installed is used, orjson then ujson, and the
+# stdlib json otherwise.
+if orjson:
+    _JSON_BACKEND = "orjson"
+    _json_loads = orjson.loads
+    
+    def _json_dumps(data):
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+elif ujson:
+    _JSON_BACKEND = "ujson"
+    _json_loads = ujson.loads
+    
+    def _json_dumps(data):
+        return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False)
+else:
+    _JSON_BACKEND = "json"
+    _json_loads = json.loads
+    _json_dumps = json.dumps
+
+
+# The pretty output is stored with the transactions, so it is always made
+# by the stdlib json, like the canonical one.
+def _json_pretty(data):
+    return json.dumps(data, indent=4)
+
+
+# The canonical output is hashed and stored, so it is always made by the
+# stdlib json, since the other backends format some numbers differently
+# and installing one of them must not change it.
+def _json_canonical(data):
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
 def log_error(data):
     if _LOGGER_ERROR:
         _LOGGER_ERROR.error(data)
@@ -54,26 +97,44 @@ def error(text, throw=True, code=None, ref_doctype=None, ref_name=None):
                 frappe.throw(text, title=_("Gocardless"))
 
 
+def get_json_backend():
+    return _JSON_BACKEND
+
+
+# Raises on invalid json, like the json.loads it replaces.
+def load_json(data):
+    return _json_loads(data)
+
+
 def parse_json(data, default=None):
-    if not isinstance(data, str):
+    if not isinstance(data, (str, bytes, bytearray)):
         return data
     if default is None:
         default = data
     try:
-        return json.loads(data)
+        return _json_loads(data)
     except Exception:
         return default
 
 
-def to_json(data, default=None):
+# The canonical output, with sort_keys, has sorted keys and no whitespace.
+def to_json(data, default=None, sort_keys=False, as_bytes=False):
     if isinstance(data, str):
-        return data
+        return data.encode("utf-8") if as_bytes else data
     if default is None:
         default = data
     try:
-        return json.dumps(data)
+        if sort_keys:
+            data = _json_canonical(data)
+        else:
+            data = _json_dumps(data)
     except Exception:
         return default
+    
+    if as_bytes:
+        return data if isinstance(data, bytes) else data.encode("utf-8")
+    
+    return data.decode("utf-8") if isinstance(data, bytes) else data
 
 
 def to_pretty_json(data, default=None):
@@ -82,6 +143,6 @@ def to_pretty_json(data, default=None):
     if default is None:
         default = data
     try:
-        return json.dumps(data, indent=4)
+        return _json_pretty(data)
     except Exception:
-        return default
\ No newline at end of file
+        return default
@@ -4,17 +4,32 @@
 # Licence: Please refer to LICENSE file
 
 
+import os
+
 import frappe
 from frappe import _
 from frappe.utils import (
-    get_request_session,
     get_request_site_address,
-    cstr
+    cint,
+    cstr,
+    flt
 )
 
 from .gocardless_api import GocardlessApi
+from .gocardless_breaker import (
+    check,
+    get_family,
+    record_failure,
+    record_success
+)
+from .gocardless_flight import join as join_flight, land as land_flight, make_key as make_flight_key
+from .gocardless_json_stream import iter_json_arrays
+from .gocardless_limiter import acquire, get_scope, update
+from .gocardless_transaction import NormalizedTransaction
+from .gocardless_transport import get_timeout, send
 from .gocardless_common import (
     error,
+    load_json,
     log_error,
     log_info,
     to_json,
@@ -22,9 +37,33 @@ from .gocardless_common import (
 )
 
 
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+# The api url can be pointed at a local stand-in, like the one in
+# gocardless_standin, from the site config or the environment.
+def get_api_url():
+    url = None
+    try:
+        url = frappe.conf.get("gocardless_api_url")
+    except Exception:
+        pass
+    
+    url = url or os.environ.get("GOCARDLESS_API_URL") or GocardlessApi.url
+    return url if url.endswith("/") else url + "/"
+
+
 class GocardlessConnector:
     def __init__(self):
         self.token = {}
+        self.url = get_api_url()
+        self.timeout = get_timeout()
+        self.retries = None
+    
+    
+    def configure(self, connect_timeout=None, read_timeout=None, max_retries=None):
+        self.timeout = get_timeout(flt(connect_timeout), flt(read_timeout))
+        self.retries = cint(max_retries) if max_retries is not None else None
     
     
     def connect(self, secret_id, secret_key):
@@ -74,8 +113,31 @@ class GocardlessConnector:
         return self.token
     
     
-    def _request(self, uri, data=None, auth=True, is_list=False, method=None):
-        _url = f"{GocardlessApi.url}{uri}"
+    def _request(
+        self, uri, data=None, auth=True, is_list=False, method=None, account_id=None
+    ):
+        req = self._build(uri, data, auth, method, account_id)
+        if not req:
+            return None
+        
+        # Identical concurrent GET requests share one upstream call and its
+        # result, since the account requests count against the daily quota.
+        res, token = join_flight(req["flight"]) if req["flight"] else (None, None)
+        if res:
+            return self._handle(req, res, is_list, True)
+        
+        try:
+            if (err := self._acquire(req)):
+                return err
+            
+            res = self._send(req)
+        finally:
+            land_flight(req["flight"], token, res)
+        
+        return self._handle(req, res, is_list)
+    
+    
+    def _build(self, uri, data=None, auth=True, method=None, account_id=None):
         _data = to_json(data) if isinstance(data, dict) else None
         _method = method or ("POST" if _data else "GET")
         _post = True if _method == "POST" else False
@@ -92,30 +154,82 @@ class GocardlessConnector:
             if _post:
                 _headers.update(GocardlessApi.post_headers)
         
+        return {
+            "uri": uri,
+            "url": f"{self.url}{uri}",
+            "method": _method,
+            "data": _data,
+            "headers": _headers,
+            "family": get_family(uri),
+            "flight": make_flight_key(_method, uri) if _method == "GET" else None,
+            "scope": get_scope(uri) if account_id else None,
+            "account_id": account_id,
+        }
+    
+    
+    def _acquire(self, req):
+        if (wait := check(req["family"])):
+            err = self._circuit_error(req["family"], wait)
+            log_info({"error": err, "url": req["url"], "method": req["method"]})
+            return err
+        
+        wait = acquire(req["scope"], req["account_id"])
+        if not wait:
+            return None
+        
+        err = self._rate_limit_error(req["scope"], req["account_id"], wait)
+        log_info({"error": err, "url": req["url"], "method": req["method"]})
+        return err
+    
+    
+    # Only does the http request, without touching frappe, so it is safe
+    # to be called from outside the main thread.
+    def _send(self, req, stream=False):
+        res = {}
+        try:
+            request = send(
+                req["method"], req["url"], data=req["data"], headers=req["headers"],
+                timeout=self.timeout, retries=self.retries, stream=stream
+            )
+            res["status_code"] = request.status_code
+            res["headers"] = request.headers
+            if stream and request.status_code in (200, 201):
+                res["stream"] = request
+            else:
+                res["response"] = load_json(request.content)
+        except Exception as exc:
+            res["exception"] = exc
+        
+        return res
+    
+    
+    # A result shared by another flight has already updated the rate limits
+    # and the circuit breaker, so it is only parsed.
+    def _handle(self, req, res, is_list=False, shared=False):
         def report_error(exc=None):
-            nonlocal _url, _data, _method, _headers
             log = {
-                "url": _url,
-                "method": _method,
-                "data": _data,
-                "headers": _headers
+                "url": req["url"],
+                "method": req["method"],
+                "data": req["data"],
+                "headers": req["headers"]
             }
             if exc:
                 log["exception"] = str(exc)
             log_error(log)
         
-        try:
-            request = get_request_session().request(
-                _method, _url, data=_data, headers=_headers
-            )
-            status_code = request.status_code
-            response = request.json()
-        except Exception as exc:
-            report_error(exc)
-            error(str(exc), code="FhJphGe4Bx")
+        if not shared:
+            if "headers" in res:
+                update(res["headers"], res["status_code"], req["scope"], req["account_id"])
+            
+            self._record(req, res)
+        
+        if "exception" in res:
+            report_error(res["exception"])
+            error(str(res["exception"]), code="FhJphGe4Bx")
             return None
         
-        response = parse_json(response)
+        status_code = res["status_code"]
+        response = parse_json(res["response"])
         
         if status_code != 200 and status_code != 201:
             err = GocardlessApi.parse_error(response)
@@ -135,6 +249,45 @@ class GocardlessConnector:
         return response
     
     
+    def _record(self, req, res):
+        if "exception" in res or res["status_code"] >= 500:
+            record_failure(req["family"])
+        elif res["status_code"] != 429:
+            record_success(req["family"])
+    
+    
+    def _circuit_error(self, family, wait):
+        return {
+            "error": 1,
+            "circuit_open": 1,
+            "title": "Service Unavailable",
+            "message": (
+                "Gocardless {0} requests are paused after repeated failures. "
+                + "Please try again after {1} seconds."
+            ).format(family, cint(wait) + 1),
+        }
+    
+    
+    def _rate_limit_error(self, scope, account_id, wait):
+        if scope and account_id and wait > 60:
+            message = (
+                "The daily {0} request limit of the bank account {1} has been reached. "
+                + "Please try again after {2} minutes."
+            ).format(scope, account_id, cint(wait / 60) + 1)
+        else:
+            message = (
+                "The request limit of Gocardless has been reached. "
+                + "Please try again after {0} seconds."
+            ).format(cint(wait) + 1)
+        
+        return {
+            "error": 1,
+            "rate_limited": 1,
+            "title": "Rate Limit Exceeded",
+            "message": message,
+        }
+    
+    
     def refresh(self, refresh_token):
         if not refresh_token or not isinstance(refresh_token, str):
             error(_("Gocardless refresh token is invalid."), code="Pn6P64PVnS")
@@ -231,7 +384,10 @@ class GocardlessConnector:
     
     
     def get_accounts(self, auth_id):
-        data = self._request(GocardlessApi.bank_accounts(auth_id))
+        return self._parse_accounts(self._request(GocardlessApi.bank_accounts(auth_id)))
+    
+    
+    def _parse_accounts(self, data):
         if "error" in data:
             return data
         
@@ -257,7 +413,12 @@ class GocardlessConnector:
     
     
     def get_account_data(self, account_id):
-        data = self._request(GocardlessApi.account_data(account_id))
+        return self._parse_account_data(
+            self._request(GocardlessApi.account_data(account_id))
+        )
+    
+    
+    def _parse_account_data(self, data):
         if "error" in data:
             return data
         
@@ -284,7 +445,16 @@ class GocardlessConnector:
     
     
     def get_account_balances(self, account_id):
-        data = self._request(GocardlessApi.account_balances(account_id))
+        return self._parse_account_balances(
+            account_id,
+            self._request(
+                GocardlessApi.account_balances(account_id),
+                account_id=account_id
+            )
+        )
+    
+    
+    def _parse_account_balances(self, account_id, data):
         if "error" in data:
             return data
         
@@ -334,7 +504,15 @@ class GocardlessConnector:
     
     
     def get_account_details(self, account_id):
-        data = self._request(GocardlessApi.account_details(account_id))
+        return self._parse_account_details(
+            self._request(
+                GocardlessApi.account_details(account_id),
+                account_id=account_id
+            )
+        )
+    
+    
+    def _parse_account_details(self, data):
         if "error" in data:
             return data
         
@@ -359,11 +537,7 @@ class GocardlessConnector:
         return details
     
     
-    def get_account_transactions(self, account_id, date_from, date_to):
-        data = self._request(
-            GocardlessApi.account_transactions(account_id, date_from, date_to)
-        )
-        
+    def _parse_account_transactions(self, account_id, date_from, date_to, data):
         log_info({
             "account_id": account_id,
             "from_date": date_from,
@@ -402,5 +576,72 @@ class GocardlessConnector:
         return data
     
     
-    def prepare_entries(self, data):
-        return GocardlessApi.prepare_transactions(data)
\ No newline at end of file
+    # Returns an error, or a generator of (status, entry) tuples that parses
+    # the booked and pending transactions while the response is downloaded.
+    # The generator raises when the response is cut off or invalid, so a
+    # partial response is never taken for a complete one.
+    def stream_account_transactions(self, account_id, date_from, date_to):
+        req = self._build(
+            GocardlessApi.account_transactions(account_id, date_from, date_to),
+            account_id=account_id
+        )
+        if not req:
+            return None
+        
+        if (err := self._acquire(req)):
+            return err
+        
+        res = self._send(req, True)
+        if "stream" not in res:
+            data = self._parse_account_transactions(
+                account_id, date_from, date_to, self._handle(req, res)
+            )
+            if not data or "error" in data:
+                return data
+            
+            return (
+                (status, entry)
+                for status in ["booked", "pending"]
+                for entry in data.get(status, None) or []
+                if isinstance(entry, dict)
+            )
+        
+        update(res["headers"], res["status_code"], req["scope"], account_id)
+        self._record(req, res)
+        log_info({
+            "account_id": account_id,
+            "from_date": date_from,
+            "to_date": date_to,
+            "stream": 1
+        })
+        
+        return self._iter_account_transactions(account_id, res["stream"])
+    
+    
+    def _iter_account_transactions(self, account_id, request):
+        total = 0
+        try:
+            for status, entry in iter_json_arrays(
+                request.iter_content(chunk_size=_STREAM_CHUNK_SIZE),
+                ["transactions"], ["booked", "pending"]
+            ):
+                if isinstance(entry, dict):
+                    total += 1
+                    yield status, entry
+        except Exception as exc:
+            err = _("Bank account transactions received for {0} is invalid.").format(account_id)
+            log_error({"error": err, "exception": str(exc)})
+            error(err, False, "mD5GFRngsW")
+            raise
+        finally:
+            request.close()
+        
+        if not total:
+            err = _("Bank account transactions received for {0} has no booked and pending data.").format(account_id)
+            log_error({"error": err})
+            error(err, False, "5ZMs5EQK37")
+    
+    
+    def prepare_record(self, status, data):
+        info = {}
+        return NormalizedTransaction(status, GocardlessApi.prepare_transaction(data, info), info)
\ No newline at end of file
@@ -0,0 +1,36 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import frappe
+
+
+_CURRENCIES_CACHE_KEY = "gocardless_currencies"
+_CURRENCIES_CACHE_EXPIRY = 86400
+
+
+# Returns a map of the currencies codes to their enabled status. The map is
+# cached for the whole site for a day and cleared whenever a currency is
+# changed.
+def get_currencies():
+    cache = frappe.cache().get_value(_CURRENCIES_CACHE_KEY)
+    if cache and isinstance(cache, dict):
+        return cache
+    
+    cache = {
+        v["currency_name"] or v["name"]: True if v["enabled"] else False
+        for v in frappe.get_all(
+            "Currency",
+            fields=["name", "currency_name", "enabled"],
+            limit_page_length=0
+        )
+    }
+    frappe.cache().set_value(_CURRENCIES_CACHE_KEY, cache, expires_in_sec=_CURRENCIES_CACHE_EXPIRY)
+    return cache
+
+
+# Currency doc events
+def clear_currencies_cache(*args, **kwargs):
+    frappe.cache().delete_value(_CURRENCIES_CACHE_KEY)
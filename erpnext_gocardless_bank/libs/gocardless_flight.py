@@ -0,0 +1,116 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import time
+import uuid
+
+import frappe
+from requests.structures import CaseInsensitiveDict
+
+from .gocardless_common import log_error, parse_json, to_json
+
+
+_FLIGHT_CACHE_KEY = "gocardless_flight"
+_FLIGHT_LOCK_TIMEOUT = 90
+_FLIGHT_RESULT_EXPIRY = 15
+_FLIGHT_MAX_WAIT = 30
+_FLIGHT_POLL = 0.1
+
+
+# Returns the shared result if there is one, otherwise takes the lead of
+# the flight by setting the lock with the caller token.
+_JOIN_SCRIPT = """
+local res = redis.call("GET", KEYS[1])
+if res then
+    return {"res", res}
+end
+if redis.call("SET", KEYS[2], ARGV[1], "NX", "EX", tonumber(ARGV[2])) then
+    return {"lead", ""}
+end
+return {"wait", ""}
+"""
+
+
+# Stores the result, when given, and releases the lock only if it is still
+# held by the caller, so an expired lead never releases the next one.
+_LAND_SCRIPT = """
+if ARGV[2] ~= "" then
+    redis.call("SET", KEYS[1], ARGV[2], "EX", tonumber(ARGV[3]))
+end
+if redis.call("GET", KEYS[2]) == ARGV[1] then
+    redis.call("DEL", KEYS[2])
+end
+return 1
+"""
+
+
+def make_key(method, uri):
+    key = frappe.cache().make_key(f"{_FLIGHT_CACHE_KEY}|{method}|{uri}")
+    return [key + "|res", key + "|lock"]
+
+
+# Returns a tuple of (res, token). The res is the result shared by the
+# request in flight or landed recently, while the token means that the caller
+# leads the flight and must land it. When both are empty, the caller could not
+# join the flight and should send its own request.
+def join(keys, wait=True):
+    token = uuid.uuid4().hex
+    deadline = time.time() + _FLIGHT_MAX_WAIT
+    try:
+        while True:
+            state, res = frappe.cache().eval(
+                _JOIN_SCRIPT, 2, *keys, token, _FLIGHT_LOCK_TIMEOUT
+            )
+            if isinstance(state, bytes):
+                state = state.decode()
+            if state == "res":
+                return _load(res), None
+            if state == "lead":
+                return None, token
+            if not wait or time.time() >= deadline:
+                return None, None
+            
+            time.sleep(_FLIGHT_POLL)
+    except Exception as exc:
+        log_error({"info": "Gocardless request coalescing is unavailable", "exception": str(exc)})
+    
+    return None, None
+
+
+# Only successful responses are shared, so the followers of a failed flight
+# retry on their own instead of all getting the same error.
+def land(keys, token, res=None):
+    if not token:
+        return 0
+    
+    data = ""
+    if res and "response" in res and res.get("status_code", 0) in (200, 201):
+        data = to_json({
+            "status_code": res["status_code"],
+            "headers": dict(res.get("headers") or {}),
+            "response": res["response"],
+        }, "")
+    
+    try:
+        frappe.cache().eval(
+            _LAND_SCRIPT, 2, *keys, token, data, _FLIGHT_RESULT_EXPIRY
+        )
+    except Exception as exc:
+        log_error({"info": "Unable to share the Gocardless request result", "exception": str(exc)})
+    
+    return 1
+
+
+def _load(data):
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    
+    res = parse_json(data)
+    if not res or not isinstance(res, dict):
+        return None
+    
+    res["headers"] = CaseInsensitiveDict(res.get("headers") or {})
+    return res
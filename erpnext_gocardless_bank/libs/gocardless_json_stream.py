@@ -0,0 +1,121 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import codecs
+import json
+
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class JsonStreamReader:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+    
+    
+    def fill(self):
+        while not self.eof:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.eof = True
+                text = self.decoder.decode(b"", final=True)
+            else:
+                text = self.decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            
+            if text:
+                self.buffer = self.buffer[self.pos:] + text
+                self.pos = 0
+                return True
+        
+        return False
+    
+    
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+    
+    
+    def next(self):
+        char = self.peek()
+        if not char:
+            raise ValueError("Unexpected end of the json stream.")
+        self.pos += 1
+        return char
+    
+    
+    def expect(self, char):
+        if self.next() != char:
+            raise ValueError(f"Expected \"{char}\" at position {self.pos} of the json stream.")
+    
+    
+    # A value that ends with the buffer may be truncated, like a number, so it
+    # is only accepted once more data is read or the stream is exhausted.
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                val, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            
+            if end == len(self.buffer) and self.fill():
+                continue
+            
+            self.pos = end
+            return val
+
+
+# Yields (key, item) for every item of the arrays named in keys that are found
+# in the object at path, reading the chunks incrementally so that only one item
+# is held in memory at once. Any other value is parsed and dropped.
+def iter_json_arrays(chunks, path, keys):
+    yield from _iter_object(JsonStreamReader(chunks), list(path), keys)
+
+
+def _iter_object(reader, path, keys):
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.next()
+        return
+    
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if path and key == path[0] and reader.peek() == "{":
+            yield from _iter_object(reader, path[1:], keys)
+        elif not path and key in keys and reader.peek() == "[":
+            reader.next()
+            if reader.peek() == "]":
+                reader.next()
+            else:
+                while True:
+                    yield key, reader.value()
+                    char = reader.next()
+                    if char == "]":
+                        break
+                    if char != ",":
+                        raise ValueError(f"Invalid array at position {reader.pos} of the json stream.")
+        else:
+            reader.value()
+        
+        char = reader.next()
+        if char == "}":
+            return
+        if char != ",":
+            raise ValueError(f"Invalid object at position {reader.pos} of the json stream.")
@@ -0,0 +1,217 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import time
+
+import frappe
+from frappe.utils import cint
+
+from .gocardless_api import GocardlessApi
+from .gocardless_common import log_error
+
+
+_LIMIT_CACHE_KEY = "gocardless_rate_limit"
+_GLOBAL_SCOPE = "global"
+_GLOBAL_CAPACITY = 60
+_GLOBAL_PERIOD = 60
+_GLOBAL_MAX_WAIT = 15
+_ACCOUNT_CAPACITY = 4
+_ACCOUNT_PERIOD = 86400
+_DEFAULT_BLOCK = 60
+
+
+# Atomic token bucket shared by all the workers of the site. The bucket
+# refills continuously, while "blocked" holds the reset time reported by
+# the server once the remaining quota reaches zero.
+_TAKE_SCRIPT = """
+local capacity = tonumber(redis.call("HGET", KEYS[1], "capacity") or ARGV[1])
+local period = tonumber(redis.call("HGET", KEYS[1], "period") or ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(redis.call("HGET", KEYS[1], "tokens") or capacity)
+local ts = tonumber(redis.call("HGET", KEYS[1], "ts") or now)
+local blocked = tonumber(redis.call("HGET", KEYS[1], "blocked") or 0)
+local wait = 0
+if blocked > now then
+    wait = blocked - now
+else
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * capacity / period)
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) * period / capacity
+    end
+end
+redis.call("HMSET", KEYS[1], "tokens", tostring(tokens), "ts", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(period + math.max(0, blocked - now)) + 60)
+return tostring(wait)
+"""
+
+
+_SYNC_SCRIPT = """
+local now = tonumber(ARGV[4])
+local blocked = 0
+if tonumber(ARGV[2]) <= 0 then
+    blocked = now + tonumber(ARGV[3])
+end
+redis.call(
+    "HMSET", KEYS[1],
+    "capacity", ARGV[1], "period", ARGV[5],
+    "tokens", ARGV[2], "ts", tostring(now), "blocked", tostring(blocked)
+)
+redis.call("EXPIRE", KEYS[1], math.ceil(math.max(tonumber(ARGV[5]), tonumber(ARGV[3]))) + 60)
+return 1
+"""
+
+
+# Returns the whole tokens left in the bucket without taking any, or -1
+# when the bucket has not been used yet.
+_PEEK_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return -1
+end
+local capacity = tonumber(redis.call("HGET", KEYS[1], "capacity") or ARGV[1])
+local period = tonumber(redis.call("HGET", KEYS[1], "period") or ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(redis.call("HGET", KEYS[1], "tokens") or capacity)
+local ts = tonumber(redis.call("HGET", KEYS[1], "ts") or now)
+local blocked = tonumber(redis.call("HGET", KEYS[1], "blocked") or 0)
+if blocked > now then
+    return 0
+end
+return math.floor(math.min(capacity, tokens + math.max(0, now - ts) * capacity / period))
+"""
+
+
+def get_scope(uri):
+    for scope in GocardlessApi.rate_limit_scopes:
+        if f"/{scope}/" in uri:
+            return scope
+    
+    return None
+
+
+def make_key(scope, account_id=None):
+    key = f"{_LIMIT_CACHE_KEY}|{scope}"
+    if account_id:
+        key = f"{key}|{account_id}"
+    return frappe.cache().make_key(key)
+
+
+def take(scope, account_id=None):
+    if scope == _GLOBAL_SCOPE:
+        capacity, period = _GLOBAL_CAPACITY, _GLOBAL_PERIOD
+    else:
+        capacity, period = _ACCOUNT_CAPACITY, _ACCOUNT_PERIOD
+    
+    try:
+        wait = frappe.cache().eval(
+            _TAKE_SCRIPT, 1, make_key(scope, account_id),
+            capacity, period, time.time()
+        )
+    except Exception as exc:
+        log_error({"info": "Gocardless rate limiter is unavailable", "exception": str(exc)})
+        return 0
+    
+    if isinstance(wait, bytes):
+        wait = wait.decode()
+    try:
+        return max(float(wait), 0)
+    except Exception:
+        return 0
+
+
+def remaining(scope, account_id):
+    try:
+        tokens = cint(frappe.cache().eval(
+            _PEEK_SCRIPT, 1, make_key(scope, account_id),
+            _ACCOUNT_CAPACITY, _ACCOUNT_PERIOD, time.time()
+        ))
+    except Exception as exc:
+        log_error({"info": "Gocardless rate limiter is unavailable", "exception": str(exc)})
+        return None
+    
+    return tokens if tokens >= 0 else None
+
+
+# Returns the number of seconds to wait before the request can be sent,
+# or 0 if it can be sent right away. Short waits on the global bucket are
+# slept here, while an exhausted account quota is reported to the caller
+# since it only resets after hours. The global bucket is taken first, so an
+# account token, that is scarce, is never spent on a request that is not sent.
+def acquire(scope=None, account_id=None):
+    waited = 0
+    while True:
+        wait = take(_GLOBAL_SCOPE)
+        if wait <= 0:
+            break
+        if waited + wait > _GLOBAL_MAX_WAIT:
+            return wait
+        time.sleep(wait)
+        waited += wait
+    
+    if scope and account_id:
+        wait = take(scope, account_id)
+        if wait > 0:
+            return wait
+    
+    return 0
+
+
+def update(headers, status_code=None, scope=None, account_id=None):
+    if not headers:
+        return 0
+    
+    keys = GocardlessApi.rate_limit_headers
+    buckets = [(_GLOBAL_SCOPE, None, keys["limit"], keys["remaining"], keys["reset"], _GLOBAL_PERIOD)]
+    if scope and account_id:
+        buckets.append((
+            scope, account_id, keys["account_limit"],
+            keys["account_remaining"], keys["account_reset"], _ACCOUNT_PERIOD
+        ))
+    
+    synced = 0
+    for bucket, bucket_id, limit_key, remaining_key, reset_key, period in buckets:
+        limit = headers.get(limit_key, None)
+        remaining = headers.get(remaining_key, None)
+        if limit is None or remaining is None:
+            continue
+        
+        limit = cint(limit)
+        if limit <= 0:
+            continue
+        
+        reset = cint(headers.get(reset_key, 0)) or (
+            _DEFAULT_BLOCK if bucket == _GLOBAL_SCOPE else period
+        )
+        try:
+            frappe.cache().eval(
+                _SYNC_SCRIPT, 1, make_key(bucket, bucket_id),
+                limit, max(cint(remaining), 0), reset, time.time(), period
+            )
+            synced = 1
+        except Exception as exc:
+            log_error({"info": "Unable to sync Gocardless rate limits", "exception": str(exc)})
+    
+    if status_code == 429 and not synced:
+        block(scope, account_id, headers.get("Retry-After", None))
+    
+    return synced
+
+
+def block(scope=None, account_id=None, seconds=None):
+    if not scope or not account_id:
+        scope, account_id = _GLOBAL_SCOPE, None
+    
+    seconds = cint(seconds) or _DEFAULT_BLOCK
+    try:
+        frappe.cache().eval(
+            _SYNC_SCRIPT, 1, make_key(scope, account_id),
+            _GLOBAL_CAPACITY if scope == _GLOBAL_SCOPE else _ACCOUNT_CAPACITY,
+            0, seconds, time.time(),
+            _GLOBAL_PERIOD if scope == _GLOBAL_SCOPE else _ACCOUNT_PERIOD
+        )
+    except Exception as exc:
+        log_error({"info": "Unable to block Gocardless rate limits", "exception": str(exc)})
@@ -0,0 +1,81 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import frappe
+
+
+_PARTIES_CACHE_KEY = "gocardless_parties"
+_PARTIES_CACHE_EXPIRY = 86400
+_PARTY_FIELDS = {
+    "Supplier": "supplier_name",
+    "Customer": "customer_name",
+}
+
+
+def make_parties_key(party_type):
+    return f"{_PARTIES_CACHE_KEY}|{party_type}"
+
+
+def normalize_name(name):
+    return " ".join(str(name).split()).casefold()
+
+
+def normalize_iban(iban):
+    return "".join(str(iban).split()).upper()
+
+
+# Returns the index of the parties by their normalized name and by the iban
+# of their bank accounts. The index is shared by the workers through redis
+# for a day and cleared whenever a party or a bank account is changed.
+def get_party_index(party_type):
+    key = make_parties_key(party_type)
+    cache = frappe.cache().get_value(key)
+    if cache and isinstance(cache, dict):
+        return cache
+    
+    field = _PARTY_FIELDS[party_type]
+    names = {}
+    for v in frappe.get_all(
+        party_type,
+        fields=["name", field],
+        order_by="modified desc",
+        limit_page_length=0
+    ):
+        names.setdefault(normalize_name(v[field] or v["name"]), v["name"])
+    
+    ibans = {}
+    for v in frappe.get_all(
+        "Bank Account",
+        fields=["party", "iban"],
+        filters={
+            "party_type": party_type,
+            "party": ["is", "set"],
+            "iban": ["is", "set"],
+        },
+        order_by="modified desc",
+        limit_page_length=0
+    ):
+        ibans.setdefault(normalize_iban(v["iban"]), v["party"])
+    
+    cache = {"names": names, "ibans": ibans}
+    frappe.cache().set_value(key, cache, expires_in_sec=_PARTIES_CACHE_EXPIRY)
+    return cache
+
+
+def resolve_party(index, name, iban=None):
+    if iban and (party := index["ibans"].get(normalize_iban(iban), None)):
+        return party
+    
+    return index["names"].get(normalize_name(name), None)
+
+
+def add_party(index, name, party):
+    index["names"][normalize_name(name)] = party
+
+
+# Supplier, Customer & Bank Account doc events
+def clear_party_index(*args, **kwargs):
+    frappe.cache().delete_value([make_parties_key(k) for k in _PARTY_FIELDS])
@@ -0,0 +1,92 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from frappe.utils import flt, getdate
+
+from .gocardless_api import GocardlessApi
+from .gocardless_common import parse_json
+from .gocardless_transaction import get_references, make_transaction_id
+
+
+_MATCH_DAYS = 5
+_MATCH_REFERENCES = tuple(
+    GocardlessApi.transactions["information"][k]
+    for k in ["endToEndId", "entryReference"]
+)
+
+
+def make_amount_key(currency, amount):
+    return (str(currency or "").upper(), "{:.2f}".format(flt(amount, 2) + 0.0))
+
+
+# Returns the dedupe key of a stored transaction, the id given by the bank,
+# unless the id has been generated from the fingerprint.
+def get_transaction_key(transaction_id, fingerprint):
+    if fingerprint and (not transaction_id or transaction_id == make_transaction_id(fingerprint)):
+        return ("gocardless_fingerprint", fingerprint)
+    
+    return ("transaction_id", str(transaction_id))
+
+
+# The key of a settled pending transaction is kept as "fieldname|value".
+def dump_key(key):
+    return "|".join(key)
+
+
+def load_key(value):
+    return tuple(value.split("|", 1)) if value and "|" in value else None
+
+
+# Indexes the pending bank transactions by currency and amount, the rows are
+# dicts of the Bank Transaction fields.
+def make_pending_index(rows):
+    index = {}
+    for v in rows:
+        key = make_amount_key(v["currency"], flt(v["deposit"]) - flt(v["withdrawal"]))
+        index.setdefault(key, []).append({
+            "name": v["name"],
+            "key": get_transaction_key(v["transaction_id"], v["gocardless_fingerprint"]),
+            "date": getdate(v["date"]),
+            "party": (v["party_type"], v["party"]) if v.get("party", None) else None,
+            "references": get_references(parse_json(v.get("gocardless_transaction_info", None))),
+        })
+    
+    return index
+
+
+# Returns the pending transaction that matches the booked record
+# and removes it from the index, so it is only matched once. The candidates
+# have the same currency and amount, a date close enough and no conflicting
+# party or references. The one that shares the most references wins, then
+# the closest in date.
+def match_pending(index, row, party=None, max_days=_MATCH_DAYS):
+    candidates = index.get(make_amount_key(row.currency, row.amount), None)
+    if not candidates or not row.posting_date:
+        return None
+    
+    posting_date = getdate(row.posting_date)
+    best = None
+    best_score = None
+    for i, v in enumerate(candidates):
+        days = abs((posting_date - v["date"]).days)
+        if days > max_days:
+            continue
+        if party and v["party"] and party[0] == v["party"][0] and party != v["party"]:
+            continue
+        
+        shared = [k for k in _MATCH_REFERENCES if k in v["references"] and k in row.references]
+        if any(v["references"][k] != row.references[k] for k in shared):
+            continue
+        
+        score = (-len(shared), days)
+        if best_score is None or score < best_score:
+            best = i
+            best_score = score
+    
+    if best is None:
+        return None
+    
+    return candidates.pop(best)
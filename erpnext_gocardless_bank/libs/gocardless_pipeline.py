@@ -0,0 +1,86 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from itertools import islice
+from operator import attrgetter
+
+
+# The transactions sync is a chain of generator stages over the transaction
+# records, spool -> normalize -> validate -> dedupe -> reconcile -> persist,
+# so only a bounded batch of rows is held in memory at once, whatever the size
+# of the response.
+# The stages take their frappe dependent parts as callables, so each one can
+# be run and measured on its own.
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while (batch := list(islice(rows, size))):
+        yield batch
+
+
+def track(rows, stats, key):
+    stats[key] = stats.get(key, 0)
+    for row in rows:
+        stats[key] += 1
+        yield row
+
+
+# Turns the (status, entry) tuples that are fetched into records.
+def normalize(rows, prepare):
+    for status, entry in rows:
+        yield prepare(status, entry)
+
+
+# Sets the position of each record in the rows received, so the sync can be
+# checkpointed right after the last record that has been persisted.
+def number(rows, start=0):
+    for i, row in enumerate(rows, start):
+        row.position = i
+        yield row
+
+
+def watch(rows, observe):
+    for row in rows:
+        observe(row)
+        yield row
+
+
+def validate(rows, check):
+    for row in rows:
+        if check(row):
+            yield row
+
+
+# Drops the rows that have been applied to an existing row by match.
+def reconcile(rows, match):
+    for row in rows:
+        if not match(row):
+            yield row
+
+
+# Drops the rows with any of their keys that has already been seen in the
+# stream or that already exists, looking up the existing keys once per batch.
+def dedupe(rows, get_existing, size, keys=attrgetter("keys")):
+    seen = set()
+    for batch in batched(rows, size):
+        ids = {k for row in batch for k in keys(row)} - seen
+        existing = set(get_existing(list(ids))) if ids else set()
+        for row in batch:
+            row_keys = keys(row)
+            if any(k in seen or k in existing for k in row_keys):
+                continue
+            
+            seen.update(row_keys)
+            yield row
+
+
+def persist(rows, save, size):
+    total = 0
+    for batch in batched(rows, size):
+        total += save(batch) or 0
+    
+    return total
@@ -0,0 +1,50 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from datetime import datetime, timedelta
+
+from frappe.utils import cint, DATE_FORMAT
+
+
+# Returns the ordered (date_from, date_to) windows to sync the range with,
+# inclusive, along with the date the range has been cut from, if any. The
+# history of the bank starts max_days before today, so the part of the range
+# that is older than that is cut, and what is left always fits in a single
+# transactions request. No window is returned when the range is out of the
+# history or when there is no quota left.
+def plan_sync_windows(date_from, date_to, max_days=None, quota=None, today=None):
+    date_from = _to_date(date_from)
+    date_to = _to_date(date_to)
+    today = _to_date(today) if today else datetime.utcnow().date()
+    max_days = cint(max_days)
+    if not date_from or not date_to:
+        return [], None
+    
+    cut = None
+    if max_days > 0 and date_from < (start := today - timedelta(days=max_days - 1)):
+        date_from = cut = start
+    
+    if date_from > date_to or (quota is not None and cint(quota) <= 0):
+        return [], None
+    
+    return (
+        [(date_from.strftime(DATE_FORMAT), date_to.strftime(DATE_FORMAT))],
+        cut.strftime(DATE_FORMAT) if cut else None
+    )
+
+
+def _to_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value[:10], DATE_FORMAT).date()
+        except Exception:
+            return None
+    
+    return value
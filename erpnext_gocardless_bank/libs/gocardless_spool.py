@@ -0,0 +1,75 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import os
+
+import frappe
+
+from .gocardless_common import log_error, parse_json, to_json
+
+
+# The transactions received for a sync window are spooled to a file in the
+# site private folder, one json line per (status, entry), so an interrupted
+# sync can resume from its last checkpoint without requesting them again.
+_SPOOL_DIR = "gocardless_sync"
+
+
+def get_spool_path(name):
+    return frappe.get_site_path("private", _SPOOL_DIR, f"{name}.jsonl")
+
+
+def has_spool(name):
+    return bool(name) and os.path.isfile(get_spool_path(name))
+
+
+# Writes the rows to a temporary file that is only renamed once all of them
+# have been written, so a spool that exists is always complete. Any error
+# raised by the rows, like a response that has been cut off, is raised
+# after removing the temporary file.
+def write_spool(name, rows):
+    path = get_spool_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    total = 0
+    try:
+        with open(tmp, "wb") as f:
+            for row in rows:
+                f.write(to_json(list(row), b"[]", as_bytes=True))
+                f.write(b"\n")
+                total += 1
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    
+    os.replace(tmp, path)
+    return total
+
+
+def read_spool(name, offset=0):
+    with open(get_spool_path(name), "rb") as f:
+        for i, line in enumerate(f):
+            if i < offset or not line.strip():
+                continue
+            
+            row = parse_json(line, None)
+            if row and isinstance(row, list) and len(row) == 2:
+                yield row[0], row[1]
+
+
+def remove_spool(name):
+    if not name:
+        return 0
+    
+    path = get_spool_path(name)
+    for v in [path, path + ".tmp"]:
+        try:
+            if os.path.exists(v):
+                os.remove(v)
+        except Exception as exc:
+            log_error(exc)
+    
+    return 1
@@ -0,0 +1,433 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+# Local stand-in of the Gocardless Bank Account Data API, to exercise the
+# connector offline. It only depends on the standard library, so it can be
+# started without a bench:
+#
+#   python -m erpnext_gocardless_bank.libs.gocardless_standin --port 8765
+#
+# and the site pointed at it by setting "gocardless_api_url" in the site
+# config (or the GOCARDLESS_API_URL environment variable) to
+# "http://127.0.0.1:8765/api/v2/".
+#
+# Modes:
+#   synthetic: generated responses, with configurable latency, 429 injection
+#              and transactions volume.
+#   record:    proxies every request to the upstream api and saves the
+#              responses as fixtures, with the tokens and secrets redacted.
+#              The fixtures still hold the real account data received.
+#   replay:    serves the saved fixtures.
+
+
+import argparse
+from datetime import date, timedelta
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from urllib.error import HTTPError
+from urllib.parse import parse_qs
+from urllib.request import Request, urlopen
+import uuid
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+
+_UPSTREAM_URL = "https://bankaccountdata.gocardless.com/api/v2/"
+_PREFIX = "/api/v2/"
+_STATUS = {
+    200: "200 OK",
+    201: "201 Created",
+    400: "400 Bad Request",
+    401: "401 Unauthorized",
+    404: "404 Not Found",
+    429: "429 Too Many Requests",
+    500: "500 Internal Server Error",
+    502: "502 Bad Gateway",
+}
+_RECORD_HEADERS = ["Retry-After", "Content-Type"]
+# The secrets and tokens are never written to the fixtures.
+_REDACTED_KEYS = {"access", "refresh", "secret_id", "secret_key"}
+_REDACTED = "redacted"
+_DEFAULTS = {
+    "mode": "synthetic",
+    "upstream": _UPSTREAM_URL,
+    "fixtures": "gocardless_fixtures",
+    "latency": 0.0,
+    "rate_limit_ratio": 0.0,
+    "retry_after": 1,
+    "institutions": 50,
+    "accounts": 3,
+    "transactions_per_day": 20,
+    "pending": 5,
+    "account_limit": 4,
+    "seed": 0,
+}
+
+
+def make_app(**options):
+    opts = dict(_DEFAULTS)
+    opts.update({k: v for k, v in options.items() if v is not None})
+    rand = random.Random(opts["seed"])
+    
+    def app(environ, start_response):
+        if opts["latency"] > 0:
+            time.sleep(opts["latency"])
+        
+        method = environ.get("REQUEST_METHOD", "GET").upper()
+        path = environ.get("PATH_INFO", "/")
+        query = environ.get("QUERY_STRING", "")
+        body = _read_body(environ)
+        
+        if opts["mode"] == "record":
+            status, headers, payload = _proxy(opts, environ, method, path, query, body)
+            _save_fixture(opts, method, path, query, status, headers, payload)
+        elif opts["mode"] == "replay":
+            status, headers, payload = _load_fixture(opts, method, path, query)
+        elif opts["rate_limit_ratio"] > 0 and rand.random() < opts["rate_limit_ratio"]:
+            status, headers, payload = _rate_limited(opts)
+        else:
+            status, headers, payload = _synthetic(opts, method, path, query, body)
+        
+        if isinstance(payload, (bytes, str)):
+            payload = [payload.encode("utf-8") if isinstance(payload, str) else payload]
+        
+        headers = [("Content-Type", "application/json")] + [
+            (k, str(v)) for k, v in headers if k.lower() != "content-type"
+        ]
+        start_response(_STATUS.get(status, f"{status} Unknown"), headers)
+        return payload
+    
+    return app
+
+
+def serve(host="127.0.0.1", port=8765, **options):
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+    
+    server = make_server(host, port, make_app(**options), handler_class=QuietHandler)
+    print(f"Gocardless stand-in ({options.get('mode') or 'synthetic'}) on http://{host}:{port}{_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _read_body(environ):
+    try:
+        size = int(environ.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        size = 0
+    return environ["wsgi.input"].read(size) if size > 0 else b""
+
+
+def _json(data):
+    return json.dumps(data)
+
+
+def _rate_limited(opts):
+    return 429, [
+        ("Retry-After", opts["retry_after"]),
+        ("HTTP_X_RATELIMIT_LIMIT", 100),
+        ("HTTP_X_RATELIMIT_REMAINING", 0),
+        ("HTTP_X_RATELIMIT_RESET", opts["retry_after"]),
+    ], _json({
+        "summary": "Rate limit exceeded",
+        "detail": "Request was throttled.",
+        "status_code": 429
+    })
+
+
+def _account_headers(opts):
+    return [
+        ("HTTP_X_RATELIMIT_LIMIT", 100),
+        ("HTTP_X_RATELIMIT_REMAINING", 99),
+        ("HTTP_X_RATELIMIT_RESET", 60),
+        ("HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_LIMIT", opts["account_limit"]),
+        ("HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_REMAINING", opts["account_limit"]),
+        ("HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_RESET", 86400),
+    ]
+
+
+def _not_found(path):
+    return 404, [], _json({
+        "summary": "Not found.",
+        "detail": f"The resource {path} was not found.",
+        "status_code": 404
+    })
+
+
+def _stable_id(*parts):
+    return str(uuid.UUID(hashlib.md5("|".join(str(v) for v in parts).encode()).hexdigest()))
+
+
+def _synthetic(opts, method, path, query, body):
+    if not path.startswith(_PREFIX):
+        return _not_found(path)
+    
+    uri = path[len(_PREFIX):]
+    args = {k: v[0] for k, v in parse_qs(query).items()}
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        data = {}
+    
+    if method == "POST" and uri == "token/new/":
+        return 200, [], _json({
+            "access": uuid.uuid4().hex,
+            "access_expires": 86400,
+            "refresh": uuid.uuid4().hex,
+            "refresh_expires": 2592000
+        })
+    
+    if method == "POST" and uri == "token/refresh/":
+        return 200, [], _json({
+            "access": uuid.uuid4().hex,
+            "access_expires": 86400
+        })
+    
+    if method == "GET" and uri == "institutions/":
+        country = args.get("country", "GB").upper()
+        return 200, [], _json([
+            {
+                "id": f"STANDIN_{country}_{i:04d}",
+                "name": f"Stand-in Bank {country} {i}",
+                "bic": f"SBNK{country}{i:04d}",
+                "transaction_total_days": "730",
+                "countries": [country],
+                "logo": "",
+            }
+            for i in range(opts["institutions"])
+        ])
+    
+    if method == "POST" and uri == "agreements/enduser/":
+        return 201, [], _json({
+            "id": _stable_id("agreement", data.get("institution_id"), time.time()),
+            "created": date.today().isoformat(),
+            "institution_id": data.get("institution_id", ""),
+            "max_historical_days": data.get("max_historical_days", 90),
+            "access_valid_for_days": data.get("access_valid_for_days", 180),
+            "access_scope": data.get("access_scope", []),
+            "accepted": None
+        })
+    
+    if method == "POST" and uri == "requisitions/":
+        req_id = _stable_id("requisition", data.get("reference"))
+        return 201, [], _json({
+            "id": req_id,
+            "redirect": data.get("redirect", ""),
+            "status": "CR",
+            "institution_id": data.get("institution_id", ""),
+            "agreement": data.get("agreement", ""),
+            "reference": data.get("reference", ""),
+            "accounts": [],
+            "user_language": data.get("user_language", "EN"),
+            "link": f"{data.get('redirect', '')}?ref={data.get('reference', '')}"
+        })
+    
+    if (match := re.fullmatch(r"requisitions/([^/]+)/", uri)):
+        req_id = match.group(1)
+        if method == "DELETE":
+            return 200, [], _json({
+                "summary": "Requisition deleted",
+                "detail": f"Requisition {req_id} deleted with all its End User Agreements"
+            })
+        return 200, [], _json({
+            "id": req_id,
+            "status": "LN",
+            "accounts": [_stable_id("account", req_id, i) for i in range(opts["accounts"])]
+        })
+    
+    if method != "GET" or not (match := re.fullmatch(r"accounts/([^/]+)/(?:(balances|details|transactions)/)?", uri)):
+        return _not_found(path)
+    
+    account_id, scope = match.group(1), match.group(2)
+    if not scope:
+        return 200, [], _json({
+            "id": account_id,
+            "created": date.today().isoformat(),
+            "last_accessed": date.today().isoformat(),
+            "iban": "GB33BUKB20201555555555",
+            "institution_id": "STANDIN",
+            "status": "READY",
+            "owner_name": "Stand-in Owner"
+        })
+    
+    if scope == "balances":
+        return 200, _account_headers(opts), _json({"balances": [
+            {
+                "balanceAmount": {"amount": "1000.00", "currency": "EUR"},
+                "balanceType": k,
+                "referenceDate": date.today().isoformat()
+            }
+            for k in ["closingBooked", "expected"]
+        ]})
+    
+    if scope == "details":
+        return 200, _account_headers(opts), _json({"account": {
+            "resourceId": account_id,
+            "iban": "GB33BUKB20201555555555",
+            "currency": "EUR",
+            "name": f"Stand-in Account {account_id[:8]}",
+            "cashAccountType": "CACC"
+        }})
+    
+    date_to = _parse_date(args.get("date_to"), date.today())
+    date_from = _parse_date(args.get("date_from"), date_to - timedelta(days=90))
+    return 200, _account_headers(opts), _iter_transactions(opts, account_id, date_from, date_to)
+
+
+def _parse_date(value, default):
+    try:
+        return date.fromisoformat(value) if value else default
+    except ValueError:
+        return default
+
+
+# The transactions are generated while the response is written, so large
+# volumes do not have to fit in memory. The rows are stable for the same
+# account and day, which makes overlapping syncs return the same data.
+def _iter_transactions(opts, account_id, date_from, date_to):
+    yield b'{"transactions": {"booked": ['
+    first = True
+    day = date_from
+    while day <= date_to:
+        rand = random.Random(f"{opts['seed']}|{account_id}|{day.isoformat()}")
+        for i in range(opts["transactions_per_day"]):
+            row = _make_transaction(rand, account_id, day, i)
+            yield ((b"" if first else b",") + json.dumps(row).encode("utf-8"))
+            first = False
+        day += timedelta(days=1)
+    
+    yield b'], "pending": ['
+    rand = random.Random(f"{opts['seed']}|{account_id}|pending")
+    for i in range(opts["pending"]):
+        row = _make_transaction(rand, account_id, date_to, i, True)
+        yield ((b"," if i else b"") + json.dumps(row).encode("utf-8"))
+    
+    yield b']}}'
+
+
+def _make_transaction(rand, account_id, day, idx, pending=False):
+    amount = round(rand.uniform(-500, 500), 2) or 1.0
+    party = f"Party {rand.randint(1, 50)}"
+    row = {
+        "bookingDate": day.isoformat(),
+        "valueDate": day.isoformat(),
+        "transactionAmount": {"amount": f"{amount:.2f}", "currency": "EUR"},
+        "remittanceInformationUnstructured": f"Stand-in payment {idx}",
+        "endToEndId": _stable_id("e2e", account_id, day, idx)[:18],
+        "proprietaryBankTransactionCode": "TRANSFER",
+    }
+    if not pending:
+        row["transactionId"] = _stable_id("transaction", account_id, day, idx)
+        row["internalTransactionId"] = row["transactionId"].replace("-", "")
+    
+    if amount < 0:
+        row["creditorName"] = party
+        row["creditorAccount"] = {"iban": "GB82WEST12345698765432"}
+    else:
+        row["debtorName"] = party
+        row["debtorAccount"] = {"iban": "GB82WEST12345698765432"}
+    
+    return row
+
+
+def _fixture_path(opts, method, path, query):
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{path.strip('/')}_{query}".strip("_"))
+    digest = hashlib.md5(f"{method}|{path}|{query}".encode()).hexdigest()[:8]
+    return os.path.join(opts["fixtures"], f"{method.lower()}_{name[:100]}_{digest}.json")
+
+
+def _proxy(opts, environ, method, path, query, body):
+    uri = path[len(_PREFIX):] if path.startswith(_PREFIX) else path.lstrip("/")
+    url = opts["upstream"] + uri + (f"?{query}" if query else "")
+    headers = {"Accept": "application/json"}
+    for key in ["HTTP_AUTHORIZATION", "CONTENT_TYPE"]:
+        if environ.get(key):
+            headers["Authorization" if key == "HTTP_AUTHORIZATION" else "Content-Type"] = environ[key]
+    
+    try:
+        with urlopen(Request(url, data=body or None, headers=headers, method=method)) as response:
+            return response.status, list(response.headers.items()), response.read()
+    except HTTPError as exc:
+        return exc.code, list(exc.headers.items()), exc.read()
+
+
+def _save_fixture(opts, method, path, query, status, headers, payload):
+    os.makedirs(opts["fixtures"], exist_ok=True)
+    try:
+        body = _redact(json.loads(payload))
+    except ValueError:
+        body = payload.decode("utf-8", "replace")
+        for key in _REDACTED_KEYS:
+            body = re.sub(
+                rf'("{key}"\s*:\s*)"[^"]*"', rf'\1"{_REDACTED}"', body
+            )
+    
+    headers = [
+        (k, v) for k, v in headers
+        if k in _RECORD_HEADERS or k.upper().startswith("HTTP_X_RATELIMIT")
+    ]
+    with open(_fixture_path(opts, method, path, query), "w") as f:
+        json.dump({"status": status, "headers": headers, "body": body}, f, indent=1)
+
+
+def _redact(data):
+    if isinstance(data, dict):
+        return {
+            k: _REDACTED if k in _REDACTED_KEYS and v else _redact(v)
+            for k, v in data.items()
+        }
+    if isinstance(data, list):
+        return [_redact(v) for v in data]
+    
+    return data
+
+
+def _load_fixture(opts, method, path, query):
+    fixture = _fixture_path(opts, method, path, query)
+    if not os.path.exists(fixture):
+        return _not_found(path)
+    
+    with open(fixture) as f:
+        data = json.load(f)
+    
+    body = data.get("body")
+    return (
+        data.get("status", 200),
+        [tuple(v) for v in data.get("headers", [])],
+        body if isinstance(body, str) else _json(body)
+    )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Gocardless Bank Account Data API stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mode", choices=["synthetic", "record", "replay"], default=_DEFAULTS["mode"])
+    parser.add_argument("--upstream", default=_DEFAULTS["upstream"])
+    parser.add_argument("--fixtures", default=_DEFAULTS["fixtures"])
+    parser.add_argument("--latency", type=float, default=_DEFAULTS["latency"], help="Seconds added to every response.")
+    parser.add_argument("--rate-limit-ratio", type=float, default=_DEFAULTS["rate_limit_ratio"], help="Ratio of requests answered with 429.")
+    parser.add_argument("--retry-after", type=int, default=_DEFAULTS["retry_after"])
+    parser.add_argument("--institutions", type=int, default=_DEFAULTS["institutions"])
+    parser.add_argument("--accounts", type=int, default=_DEFAULTS["accounts"])
+    parser.add_argument("--transactions-per-day", type=int, default=_DEFAULTS["transactions_per_day"])
+    parser.add_argument("--pending", type=int, default=_DEFAULTS["pending"])
+    parser.add_argument("--account-limit", type=int, default=_DEFAULTS["account_limit"])
+    parser.add_argument("--seed", type=int, default=_DEFAULTS["seed"])
+    opts = vars(parser.parse_args(args))
+    serve(**opts)
+
+
+if __name__ == "__main__":
+    main()
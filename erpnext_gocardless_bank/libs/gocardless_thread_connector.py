@@ -0,0 +1,78 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .gocardless_api import GocardlessApi
+from .gocardless_batch_connector import BatchGocardlessConnector
+from .gocardless_flight import join as join_flight, land as land_flight
+
+
+# Thread pool variant of the batch connector. The requests are built, rate
+# limited, handled and parsed in the calling thread, so the frappe context
+# is never used by the pool threads which only send the http requests.
+class ThreadGocardlessConnector(BatchGocardlessConnector):
+    calls = {
+        "get_account_data": (
+            GocardlessApi.account_data, False,
+            lambda client, account_id, data: client._parse_account_data(data)
+        ),
+        "get_account_balances": (
+            GocardlessApi.account_balances, True,
+            lambda client, account_id, data: client._parse_account_balances(account_id, data)
+        ),
+        "get_account_details": (
+            GocardlessApi.account_details, True,
+            lambda client, account_id, data: client._parse_account_details(data)
+        ),
+    }
+    
+    
+    # A request that is already in flight elsewhere is not waited for, so the
+    # batch is never held back, but a result shared recently is reused.
+    def run(self, calls):
+        reqs = []
+        shared = []
+        tokens = {}
+        results = [None] * len(calls)
+        for i, (method, account_id) in enumerate(calls):
+            uri, limited, _ = self.calls[method]
+            req = self.client._build(
+                uri(account_id),
+                account_id=account_id if limited else None
+            )
+            if not req:
+                continue
+            
+            res, token = join_flight(req["flight"], False) if req["flight"] else (None, None)
+            if res:
+                shared.append(((i, req), res))
+            elif (err := self.client._acquire(req)):
+                land_flight(req["flight"], token)
+                results[i] = err
+            else:
+                tokens[i] = token
+                reqs.append((i, req))
+        
+        responses = []
+        if reqs:
+            try:
+                with ThreadPoolExecutor(max_workers=min(self.concurrency, len(reqs))) as executor:
+                    responses = list(executor.map(self.client._send, [req for _, req in reqs]))
+            finally:
+                for n, (i, req) in enumerate(reqs):
+                    land_flight(req["flight"], tokens[i], responses[n] if responses else None)
+        
+        for (i, req), res, is_shared in (
+            [(v, res, True) for v, res in shared] +
+            [(v, res, False) for v, res in zip(reqs, responses)]
+        ):
+            method, account_id = calls[i]
+            results[i] = self.calls[method][2](
+                self.client, account_id, self.client._handle(req, res, False, is_shared)
+            )
+        
+        return results
@@ -0,0 +1,176 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from datetime import date
+import hashlib
+import json
+import uuid
+
+from frappe.utils import flt
+
+from .gocardless_api import GocardlessApi
+from .gocardless_common import to_json, to_pretty_json
+
+
+_REFERENCES = tuple(
+    GocardlessApi.transactions["information"][k]
+    for k in GocardlessApi.transactions["references"]
+)
+_PARTY_KEYS = tuple(GocardlessApi.transactions["party_keys"].values())
+_FINGERPRINT_KEYS = _PARTY_KEYS + tuple(
+    GocardlessApi.transactions["keys"][k]
+    for k in ["bookingDateTime", "valueDateTime"]
+)
+
+
+# Compact record of a prepared transaction that is passed through the sync
+# stages instead of the prepared dict. The amount sign, the posting date and
+# the fingerprint are computed once when the record is created.
+class NormalizedTransaction:
+    __slots__ = (
+        "status",
+        "transaction_id",
+        "date",
+        "posting_date",
+        "amount",
+        "deposit",
+        "withdrawal",
+        "currency",
+        "description",
+        "reference_number",
+        "information",
+        "supplier",
+        "customer",
+        "fingerprint",
+        "references",
+        "key",
+        "keys",
+        "position",
+    )
+    
+    
+    def __init__(self, status, data, information=None):
+        self.status = status
+        self.position = None
+        self.transaction_id = data.get("transaction_id", None)
+        self.date = data.get("date", None)
+        self.posting_date = parse_date(self.date)
+        self.currency = data.get("currency", None)
+        self.description = data.get("description", "")
+        self.reference_number = data.get("reference_number", "")
+        self.information = data.get("information", "")
+        self.supplier = data.get("supplier", None)
+        self.customer = data.get("customer", None)
+        self.amount = flt(data["amount"]) if "amount" in data else None
+        if self.amount is None:
+            self.deposit = self.withdrawal = 0
+        elif self.amount >= 0:
+            self.deposit = abs(self.amount)
+            self.withdrawal = 0
+        else:
+            self.deposit = 0
+            self.withdrawal = abs(self.amount)
+        
+        self.references = get_references(information)
+        self.fingerprint = make_fingerprint(
+            status, self.posting_date, self.amount, self.currency,
+            self.description, self.reference_number, information
+        )
+        # The transactions are matched by the id given by the bank, otherwise
+        # by the fingerprint, as (fieldname, value) of the Bank Transaction.
+        if self.transaction_id:
+            self.key = ("transaction_id", str(self.transaction_id))
+            self.keys = (self.key,)
+        else:
+            self.key = ("gocardless_fingerprint", self.fingerprint)
+            # The ones saved before the fingerprint have the id that used to be
+            # generated for them, and their fingerprint has been computed
+            # without the counterparty, so they are also matched by that id.
+            self.keys = (self.key, ("transaction_id", make_legacy_transaction_id(data, information)))
+    
+    
+    @property
+    def is_pending(self):
+        return self.status == "pending"
+    
+    
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+# The fingerprint is hashed from the canonical json of a stable subset of the
+# transaction fields, sorted and normalized, so the same bank row always gets
+# the same fingerprint, whatever the order of the keys received or the json
+# backend installed. Along with the references, the counterparty and the
+# booking and value datetimes are taken from the information, when given, so
+# identical payments of the same day to different parties do not collide.
+# It only uses values that are stored on the Bank Transaction, so it can also
+# be computed for the existing ones.
+def make_fingerprint(
+    status, posting_date, amount, currency,
+    description, reference_number, information=None
+):
+    data = {
+        "status": "pending" if status in ("pending", "Pending") else "booked",
+        "date": str(posting_date or "")[:10],
+        "amount": "{:.2f}".format(flt(amount, 2) + 0.0) if amount is not None else "",
+        "currency": str(currency or "").upper(),
+        "description": " ".join(str(description or "").split()),
+        "reference_number": str(reference_number or "").strip(),
+    }
+    data.update(get_references(information))
+    if information and isinstance(information, dict):
+        for k in _FINGERPRINT_KEYS:
+            val = information.get(k, None)
+            if val and isinstance(val, (str, int)):
+                data[k] = " ".join(str(val).split())
+    
+    return hashlib.sha256(to_json(data, "", True).encode("utf-8")).hexdigest()
+
+
+# Returns the references of the transaction, end to end id, entry reference...,
+# from its information, keyed by their label.
+def get_references(information):
+    refs = {}
+    if information and isinstance(information, dict):
+        for k in _REFERENCES:
+            val = information.get(k, None)
+            if val and isinstance(val, (str, int)):
+                refs[k] = str(val).strip()
+    
+    return refs
+
+
+def make_transaction_id(fingerprint):
+    return str(uuid.UUID(fingerprint[::2]))
+
+
+# Returns the id that used to be generated for a transaction without one, from
+# the stdlib json of the whole prepared entry, with the information as it was
+# before the counterparty was added to it.
+def make_legacy_transaction_id(data, information=None):
+    info = {
+        k: v for k, v in (information or {}).items()
+        if k not in _PARTY_KEYS
+    } if isinstance(information, dict) else {}
+    data = dict(data)
+    data["information"] = to_pretty_json(info, "")
+    try:
+        data = json.dumps(data)
+    except Exception:
+        data = ""
+    
+    return str(uuid.UUID(hashlib.sha256(data.encode("utf-8")).hexdigest()[::2]))
+
+
+def parse_date(value):
+    if not value or not isinstance(value, str):
+        return None
+    
+    try:
+        return date.fromisoformat(value[:10]).isoformat()
+    except Exception:
+        return None
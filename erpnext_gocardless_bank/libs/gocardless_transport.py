@@ -0,0 +1,131 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+_POOL_CONNECTIONS = 4
+_POOL_MAXSIZE = 16
+_CONNECT_TIMEOUT = 10
+_READ_TIMEOUT = 60
+_MAX_RETRIES = 3
+_BACKOFF_BASE = 0.5
+_BACKOFF_CAP = 30
+_RETRY_AFTER_CAP = 60
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+_IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "DELETE")
+_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive"
+}
+
+
+_SESSION = None
+_SESSION_PID = None
+
+
+# The session is kept per process so that the TLS connections are reused
+# by all the calls of a worker, and rebuilt after a fork since the pooled
+# sockets must never be shared between processes.
+def get_session():
+    global _SESSION, _SESSION_PID
+    
+    pid = os.getpid()
+    if _SESSION is None or _SESSION_PID != pid:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=_POOL_CONNECTIONS,
+            pool_maxsize=_POOL_MAXSIZE,
+            max_retries=0
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(_HEADERS)
+        _SESSION = session
+        _SESSION_PID = pid
+    
+    return _SESSION
+
+
+def get_timeout(connect_timeout=None, read_timeout=None):
+    connect_timeout = connect_timeout if connect_timeout and connect_timeout > 0 else _CONNECT_TIMEOUT
+    read_timeout = read_timeout if read_timeout and read_timeout > 0 else _READ_TIMEOUT
+    return (connect_timeout, read_timeout)
+
+
+def get_retry_after(response):
+    value = response.headers.get("Retry-After", "")
+    if not value:
+        return None
+    
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    
+    try:
+        delay = parsedate_to_datetime(value).timestamp() - time.time()
+    except Exception:
+        return None
+    
+    return max(delay, 0)
+
+
+def get_backoff(attempt):
+    return random.uniform(0, min(_BACKOFF_CAP, _BACKOFF_BASE * (2 ** attempt)))
+
+
+def send(
+    method, url, data=None, headers=None,
+    timeout=None, retries=None, stream=False
+):
+    method = method.upper()
+    idempotent = method in _IDEMPOTENT_METHODS
+    timeout = timeout or get_timeout()
+    retries = _MAX_RETRIES if retries is None or retries < 0 else retries
+    session = get_session()
+    attempt = 0
+    
+    while True:
+        try:
+            response = session.request(
+                method, url, data=data, headers=headers,
+                timeout=timeout, stream=stream
+            )
+        except requests.exceptions.ConnectTimeout:
+            if attempt >= retries:
+                raise
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout
+        ):
+            if not idempotent or attempt >= retries:
+                raise
+        else:
+            status_code = response.status_code
+            if (
+                attempt >= retries or
+                status_code not in _RETRY_STATUS or
+                (not idempotent and status_code != 429)
+            ):
+                return response
+            
+            delay = get_retry_after(response)
+            if delay is not None and delay > _RETRY_AFTER_CAP:
+                return response
+            
+            response.close()
+            time.sleep(delay if delay is not None else get_backoff(attempt))
+            attempt += 1
+            continue
+        
+        time.sleep(get_backoff(attempt))
+        attempt += 1
@@ -0,0 +1,70 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from .gocardless_common import parse_json
+
+
+# The watermark of a bank account is the latest booked date seen, the ids of
+# the transactions seen at that date and the oldest pending date seen, since
+# a pending transaction can be booked at its own date. It is kept as a dict,
+# so it can be saved along with the sync state.
+_MAX_IDS = 1000
+
+
+def make_watermark(booked=None, ids=None):
+    ids = parse_json(ids, None) if ids else None
+    if not isinstance(ids, list):
+        ids = []
+    
+    return {
+        "booked": str(booked)[:10] if booked else None,
+        "ids": [str(v) for v in ids[:_MAX_IDS]],
+        "pending": None,
+    }
+
+
+def is_seen(mark, row):
+    return (
+        not row.is_pending and row.posting_date is not None and
+        row.posting_date == mark["booked"] and
+        str(row.transaction_id) in mark["ids"]
+    )
+
+
+def observe(mark, row):
+    if not row.posting_date:
+        return None
+    
+    if row.is_pending:
+        if not mark["pending"] or row.posting_date < mark["pending"]:
+            mark["pending"] = row.posting_date
+        return None
+    
+    if not mark["booked"] or row.posting_date > mark["booked"]:
+        mark["booked"] = row.posting_date
+        mark["ids"] = []
+    
+    if (
+        row.posting_date == mark["booked"] and row.transaction_id and
+        len(mark["ids"]) < _MAX_IDS and str(row.transaction_id) not in mark["ids"]
+    ):
+        mark["ids"].append(str(row.transaction_id))
+    
+    return None
+
+
+# The pending date saved before is kept when the range synced does not
+# reach it, since the pending transactions of that date have not been
+# received again.
+def get_pending_watermark(mark, pending, date_from, date_to=None):
+    pending = str(pending)[:10] if pending else None
+    if pending and (
+        (date_from and pending < str(date_from)[:10]) or
+        (date_to and pending > str(date_to)[:10])
+    ):
+        return min(pending, mark["pending"]) if mark["pending"] else pending
+    
+    return mark["pending"]
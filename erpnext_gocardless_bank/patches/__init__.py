@@ -0,0 +1,4 @@
+# ERPNext ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
\ No newline at end of file
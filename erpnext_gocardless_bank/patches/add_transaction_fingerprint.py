@@ -0,0 +1,55 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import frappe
+
+from erpnext_gocardless_bank.libs.gocardless_common import parse_json
+from erpnext_gocardless_bank.libs.gocardless_transaction import make_fingerprint
+from erpnext_gocardless_bank.setup.install import add_custom_fields, add_indexes
+
+
+_BATCH_SIZE = 1000
+
+
+# The fingerprint is computed from the stored transaction info. The info of
+# the transactions saved before the counterparty was kept in it has only the
+# references and the datetimes, so their fingerprint differs from the one made
+# when they are received again. Those without a bank id are still matched by
+# the id that used to be generated for them.
+def execute():
+    add_custom_fields()
+    add_indexes()
+    
+    dt = "Bank Transaction"
+    while True:
+        data = frappe.get_all(
+            dt,
+            fields=[
+                "name", "status", "date", "deposit", "withdrawal", "currency",
+                "description", "reference_number", "gocardless_transaction_info"
+            ],
+            filters={
+                "gocardless_transaction_info": ["is", "set"],
+                "gocardless_fingerprint": ["is", "not set"],
+            },
+            limit_page_length=_BATCH_SIZE
+        )
+        if not data:
+            break
+        
+        frappe.db.bulk_update(dt, {
+            v["name"]: {
+                "gocardless_fingerprint": make_fingerprint(
+                    v["status"], v["date"],
+                    (v["deposit"] or 0) - (v["withdrawal"] or 0),
+                    v["currency"], v["description"], v["reference_number"],
+                    parse_json(v["gocardless_transaction_info"])
+                )
+            } for v in data
+        }, update_modified=False)
+        
+        if len(data) < _BATCH_SIZE:
+            break
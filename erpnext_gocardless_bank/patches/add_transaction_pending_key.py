@@ -0,0 +1,12 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from erpnext_gocardless_bank.setup.install import add_custom_fields, add_indexes
+
+
+def execute():
+    add_custom_fields()
+    add_indexes()
@@ -174,6 +174,18 @@ frappe.ui.form.on('Bank Account', {
                         message: __('Bank account "{0}" is syncing in background', [frm.doc.name]),
                         indicator: 'green'
                     });
+                    if (from_date) {
+                        let account = frm._gocardless_data.account;
+                        frappe.gocardless.events.add('gocardless_bank_account_sync_progress', function(ret) {
+                            if (!ret || ret.account !== account) return;
+                            frappe.show_progress(
+                                __('Syncing Bank Account'),
+                                cint(ret.done), cint(ret.total),
+                                ret.from_date ? __('From {0} to {1}', [ret.from_date, ret.to_date]) : '',
+                                true
+                            );
+                        });
+                    }
                 },
                 function() {
                     frm._gocardless_btn.prop('disabled', false);
@@ -13,11 +13,12 @@ from erpnext_gocardless_bank.libs.gocardless import clear_sync_cache
 
 def after_install():
     clear_sync_cache()
-    _create_custom_fields()
+    add_custom_fields()
+    add_indexes()
     _add_link_to_workspace()
 
 
-def _create_custom_fields():
+def add_custom_fields():
     create_custom_fields({
         "Bank Transaction": [
             {
@@ -27,6 +28,24 @@ def _create_custom_fields():
                 "no_copy": 1,
                 "read_only": 1,
                 "insert_after": "description",
+            },
+            {
+                "label": _("Gocardless Fingerprint"),
+                "fieldname": "gocardless_fingerprint",
+                "fieldtype": "Data",
+                "hidden": 1,
+                "no_copy": 1,
+                "read_only": 1,
+                "insert_after": "transaction_id",
+            },
+            {
+                "label": _("Gocardless Pending Key"),
+                "fieldname": "gocardless_pending_key",
+                "fieldtype": "Data",
+                "hidden": 1,
+                "no_copy": 1,
+                "read_only": 1,
+                "insert_after": "gocardless_fingerprint",
             }
         ],
         "Bank Account": [
@@ -43,6 +62,17 @@ def _create_custom_fields():
     })
 
 
+def add_indexes():
+    indexes = [
+        ["transaction_id", "gocardless_transaction_id"],
+        ["gocardless_fingerprint", "gocardless_fingerprint"],
+        ["gocardless_pending_key", "gocardless_pending_key"],
+    ]
+    for field, index in indexes:
+        if frappe.db.has_column("Bank Transaction", field):
+            frappe.db.add_index("Bank Transaction", [field], index)
+
+
 def _add_link_to_workspace():
     dt = "Workspace"
     name = "ERPNext Integrations"
@@ -9,13 +9,16 @@ import frappe
 
 def before_uninstall():
     _remove_custom_fields()
+    _remove_indexes()
     _remove_link_from_workspace()
 
 
 def _remove_custom_fields():
     fields = {
         "Bank Transaction": [
-            "gocardless_transaction_info"
+            "gocardless_transaction_info",
+            "gocardless_fingerprint",
+            "gocardless_pending_key"
         ],
         "Bank Accouny": [
             "gocardless_bank_account_no"
@@ -31,6 +34,26 @@ def _remove_custom_fields():
         ).run()
 
 
+def _remove_indexes():
+    indexes = {
+        "Bank Transaction": [
+            "gocardless_transaction_id",
+            "gocardless_fingerprint",
+            "gocardless_pending_key"
+        ],
+    }
+    for k, v in indexes.items():
+        table = f"tab{k}"
+        for index in v:
+            if not frappe.db.has_index(table, index):
+                continue
+            
+            if frappe.db.db_type == "postgres":
+                frappe.db.sql_ddl(f'DROP INDEX IF EXISTS "{index}"')
+            else:
+                frappe.db.sql_ddl(f"ALTER TABLE `{table}` DROP INDEX `{index}`")
+
+
 def _remove_link_from_workspace():
     dt = "Workspace"
     name = "ERPNext Integrations"
@@ -0,0 +1,82 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import json
+import unittest
+
+from erpnext_gocardless_bank.libs.gocardless_json_stream import iter_json_arrays
+
+
+_DATA = {
+    "account": {"id": "a1", "skip": [1, {"x": "]}"}]},
+    "transactions": {
+        "booked": [
+            {"transactionId": "b1", "amount": "-10.50", "name": "Café"},
+            {"transactionId": "b2", "amount": 12345678901234567890},
+        ],
+        "pending": [],
+        "other": [{"transactionId": "o1"}],
+        "pending_extra": {"a": 1},
+    },
+}
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def _parse(chunks):
+    return list(iter_json_arrays(chunks, ["transactions"], ["booked", "pending"]))
+
+
+class TestGocardlessJsonStream(unittest.TestCase):
+    def test_items_of_the_arrays(self):
+        data = json.dumps(_DATA, ensure_ascii=False).encode("utf-8")
+        self.assertEqual(_parse([data]), [
+            ("booked", _DATA["transactions"]["booked"][0]),
+            ("booked", _DATA["transactions"]["booked"][1]),
+        ])
+    
+    
+    def test_chunks_split_anywhere(self):
+        data = json.dumps(_DATA, ensure_ascii=False, indent=2).encode("utf-8")
+        expected = _parse([data])
+        for size in [1, 2, 3, 7, 64]:
+            self.assertEqual(_parse(_chunks(data, size)), expected)
+    
+    
+    def test_number_split_at_the_end_of_a_chunk(self):
+        data = b'{"transactions": {"booked": [1234, 5678]}}'
+        pos = data.index(b"34")
+        self.assertEqual(
+            _parse([data[:pos], data[pos:]]),
+            [("booked", 1234), ("booked", 5678)]
+        )
+    
+    
+    def test_truncated_stream(self):
+        data = json.dumps(_DATA).encode("utf-8")
+        for end in [len(data) // 2, len(data) - 1]:
+            with self.assertRaises(ValueError):
+                _parse(_chunks(data[:end], 16))
+    
+    
+    def test_items_are_yielded_before_the_end(self):
+        data = json.dumps(_DATA).encode("utf-8")
+        end = data.index(b'"b2"')
+        rows = iter_json_arrays(_chunks(data[:end], 8), ["transactions"], ["booked"])
+        self.assertEqual(next(rows)[1]["transactionId"], "b1")
+        with self.assertRaises(ValueError):
+            next(rows)
+    
+    
+    def test_invalid_json(self):
+        with self.assertRaises(ValueError):
+            _parse([b'{"transactions": {"booked": [1 2]}}'])
+    
+    
+    def test_empty_object(self):
+        self.assertEqual(_parse([b"{}"]), [])
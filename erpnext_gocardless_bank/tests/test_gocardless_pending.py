@@ -0,0 +1,95 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from types import SimpleNamespace
+import unittest
+
+from erpnext_gocardless_bank.libs.gocardless_pending import (
+    dump_key,
+    get_transaction_key,
+    load_key,
+    make_pending_index,
+    match_pending
+)
+from erpnext_gocardless_bank.libs.gocardless_transaction import make_transaction_id
+
+
+_FINGERPRINT = "ab" * 32
+
+
+def _pending(name, date, amount, tid=None, info=None, party=None, fingerprint=None):
+    return {
+        "name": name,
+        "date": date,
+        "currency": "eur",
+        "deposit": amount if amount > 0 else 0,
+        "withdrawal": -amount if amount < 0 else 0,
+        "transaction_id": tid or name,
+        "gocardless_fingerprint": fingerprint,
+        "party_type": party[0] if party else None,
+        "party": party[1] if party else None,
+        "gocardless_transaction_info": info,
+    }
+
+
+def _booked(date, amount, references=None):
+    return SimpleNamespace(
+        currency="EUR", amount=amount, posting_date=date, references=references or {}
+    )
+
+
+class TestGocardlessPending(unittest.TestCase):
+    def test_transaction_key(self):
+        self.assertEqual(get_transaction_key("t1", _FINGERPRINT), ("transaction_id", "t1"))
+        self.assertEqual(
+            get_transaction_key(make_transaction_id(_FINGERPRINT), _FINGERPRINT),
+            ("gocardless_fingerprint", _FINGERPRINT)
+        )
+        self.assertEqual(get_transaction_key(None, _FINGERPRINT), ("gocardless_fingerprint", _FINGERPRINT))
+        self.assertEqual(load_key(dump_key(("transaction_id", "a|b"))), ("transaction_id", "a|b"))
+        self.assertIsNone(load_key(""))
+    
+    
+    def test_pending_is_settled_by_booked(self):
+        index = make_pending_index([
+            _pending("p1", "2026-03-01", -25.5),
+            _pending("p2", "2026-03-02", 25.5),
+        ])
+        match = match_pending(index, _booked("2026-03-03", -25.5))
+        self.assertEqual(match["name"], "p1")
+        self.assertEqual(match["key"], ("transaction_id", "p1"))
+        # A pending transaction is only matched once.
+        self.assertIsNone(match_pending(index, _booked("2026-03-03", -25.5)))
+    
+    
+    def test_closest_date_wins(self):
+        index = make_pending_index([
+            _pending("p1", "2026-03-01", -10),
+            _pending("p2", "2026-03-04", -10),
+        ])
+        self.assertEqual(match_pending(index, _booked("2026-03-05", -10))["name"], "p2")
+        self.assertEqual(match_pending(index, _booked("2026-03-05", -10))["name"], "p1")
+    
+    
+    def test_shared_references_win(self):
+        index = make_pending_index([
+            _pending("p1", "2026-03-04", -10),
+            _pending("p2", "2026-03-01", -10, info='{"End To End ID": "E2"}'),
+        ])
+        row = _booked("2026-03-05", -10, {"End To End ID": "E2"})
+        self.assertEqual(match_pending(index, row)["name"], "p2")
+    
+    
+    def test_conflicts_are_not_matched(self):
+        index = make_pending_index([
+            _pending("p1", "2026-03-01", -10, info='{"End To End ID": "E1"}'),
+            _pending("p2", "2026-03-01", -10, party=("Supplier", "S1")),
+            _pending("p3", "2026-02-01", -10),
+        ])
+        row = _booked("2026-03-02", -10, {"End To End ID": "E2"})
+        self.assertIsNone(match_pending(index, row, ("Supplier", "S2")))
+        self.assertIsNone(match_pending(index, _booked("2026-03-02", -11)))
+        self.assertEqual(match_pending(index, row, ("Supplier", "S1"))["name"], "p2")
@@ -0,0 +1,110 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from types import SimpleNamespace
+import unittest
+
+from erpnext_gocardless_bank.libs.gocardless_pipeline import (
+    batched,
+    dedupe,
+    normalize,
+    number,
+    persist,
+    reconcile,
+    track,
+    validate,
+    watch
+)
+
+
+def _row(*keys):
+    return SimpleNamespace(keys=keys, position=None)
+
+
+class TestGocardlessPipeline(unittest.TestCase):
+    def test_batched(self):
+        self.assertEqual(list(batched(range(7), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(batched([], 3)), [])
+    
+    
+    def test_stages_are_lazy(self):
+        stats = {}
+        rows = track(iter(range(1000)), stats, "received")
+        rows = validate(rows, lambda v: v % 2 == 0)
+        self.assertEqual(stats, {})
+        self.assertEqual(next(rows), 0)
+        self.assertEqual(next(rows), 2)
+        self.assertEqual(stats, {"received": 3})
+    
+    
+    def test_normalize_and_number(self):
+        rows = normalize([("booked", 1), ("pending", 2)], lambda status, entry: SimpleNamespace(
+            status=status, entry=entry, position=None
+        ))
+        rows = list(number(rows, 5))
+        self.assertEqual([(v.status, v.entry, v.position) for v in rows], [
+            ("booked", 1, 5), ("pending", 2, 6)
+        ])
+    
+    
+    def test_watch_and_reconcile(self):
+        seen = []
+        rows = watch(range(5), seen.append)
+        rows = list(reconcile(rows, lambda v: v in (1, 3)))
+        self.assertEqual(rows, [0, 2, 4])
+        self.assertEqual(seen, [0, 1, 2, 3, 4])
+    
+    
+    def test_dedupe(self):
+        lookups = []
+        
+        def get_existing(keys):
+            lookups.append(sorted(keys))
+            return [v for v in keys if v[1] in ("2", "legacy")]
+        
+        rows = [
+            _row(("transaction_id", "1")),
+            _row(("transaction_id", "2")),
+            _row(("transaction_id", "1")),
+            _row(("gocardless_fingerprint", "f"), ("transaction_id", "legacy")),
+            _row(("gocardless_fingerprint", "g"), ("transaction_id", "other")),
+            _row(("transaction_id", "3")),
+        ]
+        result = list(dedupe(iter(rows), get_existing, 4))
+        self.assertEqual(result, [rows[0], rows[4], rows[5]])
+        self.assertEqual(lookups, [
+            [
+                ("gocardless_fingerprint", "f"), ("transaction_id", "1"),
+                ("transaction_id", "2"), ("transaction_id", "legacy")
+            ],
+            [
+                ("gocardless_fingerprint", "g"), ("transaction_id", "3"),
+                ("transaction_id", "other")
+            ],
+        ])
+    
+    
+    def test_dedupe_skips_the_keys_seen(self):
+        lookups = []
+        
+        def get_existing(keys):
+            lookups.append(keys)
+            return []
+        
+        rows = [_row(("transaction_id", "1")), _row(("transaction_id", "1"))]
+        self.assertEqual(list(dedupe(iter(rows), get_existing, 1)), [rows[0]])
+        self.assertEqual(lookups, [[("transaction_id", "1")]])
+    
+    
+    def test_persist(self):
+        batches = []
+        
+        def save(batch):
+            batches.append(list(batch))
+            return len(batch) - 1
+        
+        self.assertEqual(persist(iter(range(5)), save, 2), 2)
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
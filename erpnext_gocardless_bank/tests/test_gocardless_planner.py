@@ -0,0 +1,56 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import unittest
+
+from erpnext_gocardless_bank.libs.gocardless_planner import plan_sync_windows
+
+
+class TestGocardlessPlanner(unittest.TestCase):
+    def test_range_within_history(self):
+        self.assertEqual(
+            plan_sync_windows("2026-03-01", "2026-03-20", 90, 4, "2026-03-20"),
+            ([("2026-03-01", "2026-03-20")], None)
+        )
+    
+    
+    def test_range_older_than_history_is_cut(self):
+        windows, cut = plan_sync_windows("2025-01-01", "2026-03-20", 90, 4, "2026-03-20")
+        self.assertEqual(windows, [("2025-12-21", "2026-03-20")])
+        self.assertEqual(cut, "2025-12-21")
+    
+    
+    def test_range_out_of_history(self):
+        self.assertEqual(
+            plan_sync_windows("2025-01-01", "2025-02-01", 90, 4, "2026-03-20"),
+            ([], None)
+        )
+    
+    
+    def test_no_quota_left(self):
+        self.assertEqual(
+            plan_sync_windows("2026-03-01", "2026-03-20", 90, 0, "2026-03-20"),
+            ([], None)
+        )
+    
+    
+    def test_quota_is_optional(self):
+        self.assertEqual(
+            plan_sync_windows("2026-03-01", "2026-03-02", 90, None, "2026-03-20")[0],
+            [("2026-03-01", "2026-03-02")]
+        )
+    
+    
+    def test_no_history_limit(self):
+        self.assertEqual(
+            plan_sync_windows("2020-01-01", "2026-03-20", 0, 1, "2026-03-20"),
+            ([("2020-01-01", "2026-03-20")], None)
+        )
+    
+    
+    def test_invalid_dates(self):
+        self.assertEqual(plan_sync_windows("", "2026-03-20", 90, 4), ([], None))
+        self.assertEqual(plan_sync_windows("2026-03-20", "2026-03-01", 90, 4, "2026-03-20"), ([], None))
@@ -0,0 +1,86 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+import json
+import unittest
+
+from erpnext_gocardless_bank.libs.gocardless_api import GocardlessApi
+from erpnext_gocardless_bank.libs.gocardless_transaction import (
+    NormalizedTransaction,
+    make_fingerprint,
+    make_transaction_id
+)
+
+
+def _record(entry, status="booked"):
+    info = {}
+    return NormalizedTransaction(status, GocardlessApi.prepare_transaction(dict(entry), info), info)
+
+
+_ENTRY = {
+    "bookingDate": "2026-01-02",
+    "bookingDateTime": "2026-01-02T10:00:00Z",
+    "transactionAmount": {"amount": "-10.00", "currency": "EUR"},
+    "creditorName": "Shop",
+    "creditorAccount": {"iban": "DE89370400440532013000"},
+    "remittanceInformationUnstructured": "Invoice 1",
+    "endToEndId": "E1",
+}
+
+
+class TestGocardlessTransaction(unittest.TestCase):
+    def test_record(self):
+        row = _record(dict(_ENTRY, transactionId="t1"))
+        self.assertEqual(row.posting_date, "2026-01-02")
+        self.assertEqual((row.deposit, row.withdrawal, row.currency), (0, 10, "EUR"))
+        self.assertEqual(row.supplier, {"name": "Shop", "account": "DE89370400440532013000"})
+        self.assertEqual(row.references, {"End To End ID": "E1"})
+        self.assertEqual(row.keys, (("transaction_id", "t1"),))
+        self.assertEqual(json.loads(row.information)["Creditor Name"], "Shop")
+    
+    
+    def test_fingerprint_is_stable(self):
+        row = _record(_ENTRY)
+        reordered = _record(dict(reversed(list(_ENTRY.items()))))
+        self.assertEqual(row.fingerprint, reordered.fingerprint)
+        self.assertEqual(row.fingerprint, make_fingerprint(
+            "Settled", "2026-01-02", -10, "eur", " Invoice  1 ", None,
+            json.loads(row.information)
+        ))
+    
+    
+    def test_fingerprint_fields(self):
+        row = _record(_ENTRY)
+        for k, v in [
+            ("creditorName", "Other Shop"),
+            ("creditorAccount", {"iban": "FR7630006000011234567890189"}),
+            ("bookingDateTime", "2026-01-02T11:00:00Z"),
+            ("endToEndId", "E2"),
+            ("transactionAmount", {"amount": "-10.01", "currency": "EUR"}),
+        ]:
+            self.assertNotEqual(row.fingerprint, _record(dict(_ENTRY, **{k: v})).fingerprint, k)
+        
+        self.assertNotEqual(row.fingerprint, _record(_ENTRY, "pending").fingerprint)
+    
+    
+    def test_record_without_id(self):
+        row = _record(_ENTRY)
+        self.assertEqual(row.key, ("gocardless_fingerprint", row.fingerprint))
+        self.assertEqual(len(row.keys), 2)
+        self.assertEqual(row.keys[1][0], "transaction_id")
+        self.assertNotEqual(row.keys[1][1], make_transaction_id(row.fingerprint))
+    
+    
+    # The id that the previous versions generated for a transaction without
+    # one, so the rows they saved are still found.
+    def test_legacy_transaction_id(self):
+        row = _record({
+            "transactionAmount": {"amount": "5", "currency": "GBP"},
+            "valueDate": "2026-02-01",
+            "debtorName": "Bob",
+            "remittanceInformationStructured": "s",
+        })
+        self.assertEqual(row.keys[1], ("transaction_id", "2d8c17e0-abc9-0543-50e8-f66c4a6286c5"))
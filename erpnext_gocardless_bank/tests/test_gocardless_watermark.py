@@ -0,0 +1,73 @@
+# ERPNext Gocardless Bank © 2023
+# Author:  Ameen Ahmed
+# Company: Level Up Marketing & Software Development Services
+# Licence: Please refer to LICENSE file
+
+
+from types import SimpleNamespace
+import unittest
+
+from erpnext_gocardless_bank.libs.gocardless_watermark import (
+    get_pending_watermark,
+    is_seen,
+    make_watermark,
+    observe
+)
+
+
+def _row(date, tid=None, pending=False):
+    return SimpleNamespace(posting_date=date, transaction_id=tid, is_pending=pending)
+
+
+class TestGocardlessWatermark(unittest.TestCase):
+    def test_make_watermark(self):
+        self.assertEqual(
+            make_watermark("2026-03-01 10:00:00", '["a", 1]'),
+            {"booked": "2026-03-01", "ids": ["a", "1"], "pending": None}
+        )
+        self.assertEqual(make_watermark(None, "invalid")["ids"], [])
+    
+    
+    def test_observe(self):
+        mark = make_watermark()
+        for row in [
+            _row("2026-03-01", "a"),
+            _row("2026-03-02", "b"),
+            _row("2026-03-02", "c"),
+            _row("2026-03-02", "b"),
+            _row("2026-03-01", "d"),
+            _row("2026-02-27", "p1", True),
+            _row("2026-02-25", "p2", True),
+            _row(None, "e"),
+        ]:
+            observe(mark, row)
+        
+        self.assertEqual(mark, {"booked": "2026-03-02", "ids": ["b", "c"], "pending": "2026-02-25"})
+    
+    
+    def test_is_seen(self):
+        mark = make_watermark("2026-03-02", ["b"])
+        self.assertTrue(is_seen(mark, _row("2026-03-02", "b")))
+        self.assertFalse(is_seen(mark, _row("2026-03-02", "c")))
+        self.assertFalse(is_seen(mark, _row("2026-03-01", "b")))
+        self.assertFalse(is_seen(mark, _row("2026-03-02", "b", True)))
+    
+    
+    def test_pending_watermark(self):
+        # The range synced covers the saved date, the date observed replaces it.
+        self.assertEqual(get_pending_watermark(
+            {"pending": "2026-03-10"}, "2026-03-05", "2026-03-01", "2026-03-20"
+        ), "2026-03-10")
+        self.assertIsNone(get_pending_watermark(
+            {"pending": None}, "2026-03-05", "2026-03-01", "2026-03-20"
+        ))
+        # The range synced does not reach the saved date, so it is kept.
+        self.assertEqual(get_pending_watermark(
+            {"pending": "2026-03-10"}, "2026-02-20", "2026-03-01", "2026-03-20"
+        ), "2026-02-20")
+        self.assertEqual(get_pending_watermark(
+            {"pending": None}, "2026-03-25", "2026-03-01", "2026-03-20"
+        ), "2026-03-25")
+        self.assertEqual(get_pending_watermark(
+            {"pending": "2026-03-10"}, None, "2026-03-01", "2026-03-20"
+        ), "2026-03-10")